@@ -0,0 +1,462 @@
+from __future__ import unicode_literals, absolute_import
+
+import re
+import time
+import random
+import threading
+from xml.sax.saxutils import quoteattr
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib import parse
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89'
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Fantasy', 'Horror', 'Thriller']
+COUNTRIES = ['USA', 'United Kingdom', 'France', 'Germany', 'Japan', 'Netherlands']
+CODECS = [('h264', 'aac'), ('hevc', 'ac3'), ('mpeg4', 'mp3'), ('h264', 'dca')]
+CHUNK_ITEMS = 200
+KIND_BASE = 10000000
+MOVIE, SHOW, SEASON, EPISODE, ARTIST, ALBUM, TRACK = range(7)
+KIND_NAMES = ['movie', 'show', 'season', 'episode', 'artist', 'album', 'track']
+KIND_INDEX = dict((name, kind) for kind, name in enumerate(KIND_NAMES))
+PARENTS = {SEASON: SHOW, EPISODE: SEASON, ALBUM: ARTIST, TRACK: ALBUM}
+PLEX_TYPES = {'1': MOVIE, '2': SHOW, '3': SEASON, '4': EPISODE, '8': ARTIST, '9': ALBUM, '10': TRACK}
+
+__all__ = [
+    'Library',
+    'FakePlexServer',
+]
+
+
+def _attrs(**kwargs):
+    return ' '.join('%s=%s' % (k, quoteattr('%s' % v)) for k, v in sorted(kwargs.items()))
+
+
+def _tag(_tag_name, children='', **kwargs):
+    if children:
+        return '<%s %s>%s</%s>' % (_tag_name, _attrs(**kwargs), children, _tag_name)
+    return '<%s %s/>' % (_tag_name, _attrs(**kwargs))
+
+
+class Library(object):
+    def __init__(self, movies=1000, shows=0, seasons=3, episodes=10, artists=0, albums=3, tracks=10, roles=8, seed=0,
+                 image_size=16 * 1024):
+        self.movies = movies
+        self.counts = {
+            SHOW: shows,
+            SEASON: shows * seasons,
+            EPISODE: shows * seasons * episodes,
+            ARTIST: artists,
+            ALBUM: artists * albums,
+            TRACK: artists * albums * tracks,
+        }
+        self.children = {SHOW: seasons, SEASON: episodes, ARTIST: albums, ALBUM: tracks}
+        self.roles = roles
+        self.seed = seed
+        self.image_size = image_size
+        self.updated = {}
+        self.titles = {}
+        self.section_updated = {}
+
+    def sections(self):
+        sections = []
+        if self.movies:
+            sections.append(('1', 'movie', 'Movies', MOVIE, None))
+        if self.counts[SHOW]:
+            sections.append(('2', 'show', 'TV Shows', SHOW, EPISODE))
+        if self.counts[ARTIST]:
+            sections.append(('3', 'artist', 'Music', ARTIST, TRACK))
+        return sections
+
+    def section(self, key):
+        for section in self.sections():
+            if section[0] == key:
+                return section
+        return None
+
+    def section_of(self, rating_key):
+        kind = rating_key // KIND_BASE
+        for section in self.sections():
+            if section[3] <= kind <= (section[4] or section[3]):
+                return section
+        return None
+
+    def section_updated_at(self, key):
+        return self.section_updated.get(key, 1000000000)
+
+    def count(self, kind):
+        return self.movies if kind == MOVIE else self.counts[kind]
+
+    def rating_key(self, kind, offset):
+        return KIND_BASE * kind + offset + 1
+
+    def touch(self, rating_key, when=None):
+        when = when or int(time.time())
+        self.updated[rating_key] = when
+        key = self.section_of(rating_key)[0]
+        self.section_updated[key] = max(self.section_updated_at(key), when)
+
+    def rename(self, rating_key, title, when=None):
+        self.titles[rating_key] = title
+        self.touch(rating_key, when)
+
+    def add_movie(self, when=None):
+        self.movies += 1
+        rating_key = self.rating_key(MOVIE, self.movies - 1)
+        self.touch(rating_key, when)
+        return rating_key
+
+    def updated_at(self, rating_key):
+        return self.updated.get(rating_key, 1000000000 + rating_key % KIND_BASE)
+
+    def image(self):
+        return PNG_HEADER + b'\x00' * max(0, self.image_size - len(PNG_HEADER))
+
+    def element(self, rating_key, detail=False):
+        kind, offset = divmod(rating_key, KIND_BASE)
+        offset -= 1
+        if not 0 <= offset < self.count(kind):
+            return None
+        return getattr(self, KIND_NAMES[kind])(rating_key, offset, detail)
+
+    def child_keys(self, rating_key):
+        kind, offset = divmod(rating_key, KIND_BASE)
+        count = self.children.get(kind, 0)
+        first = (offset - 1) * count
+        if not count or first + count > self.count(kind + 1):
+            return []
+        return [self.rating_key(kind + 1, x) for x in range(first, first + count)]
+
+    def parents(self, rating_key):
+        kind, offset = divmod(rating_key, KIND_BASE)
+        keys = []
+        while kind in PARENTS:
+            kind, offset = PARENTS[kind], (offset - 1) // self.children[PARENTS[kind]] + 1
+            keys.append(KIND_BASE * kind + offset)
+        return keys
+
+    def common(self, rating_key, rnd, kind, title):
+        attrs = {
+            'ratingKey': rating_key,
+            'type': kind,
+            'title': title,
+            'summary': ' '.join('lorem%d' % rnd.randint(0, 999) for _ in range(rnd.randint(10, 60))),
+            'thumb': '/library/metadata/%d/thumb/%d' % (rating_key, self.updated_at(rating_key)),
+            'addedAt': 1000000000 + rating_key % KIND_BASE,
+            'updatedAt': self.updated_at(rating_key),
+            'librarySectionID': self.section_of(rating_key)[0],
+        }
+        parents = self.parents(rating_key)
+        for prefix, key in zip(['parent', 'grandparent'], parents):
+            attrs['%sRatingKey' % prefix] = key
+            attrs['%sTitle' % prefix] = self.title(key)
+        return attrs
+
+    def title(self, rating_key):
+        if rating_key in self.titles:
+            return self.titles[rating_key]
+        kind, offset = divmod(rating_key, KIND_BASE)
+        if kind in PARENTS:
+            return '%s %d' % (KIND_NAMES[kind].title(), (offset - 1) % self.children[PARENTS[kind]] + 1)
+        return '%s %d' % (KIND_NAMES[kind].title(), offset)
+
+    def media(self, rating_key, rnd, detail, path):
+        video, audio = rnd.choice(CODECS)
+        streams = ''
+        if detail:
+            streams = _tag('Stream', streamType=1, codec=video, index=0, id=rating_key * 10) + \
+                _tag('Stream', streamType=2, codec=audio, index=1, id=rating_key * 10 + 1, language='English') + \
+                _tag('Stream', streamType=3, codec='srt', index=2, id=rating_key * 10 + 2, language='English')
+        part = _tag('Part', streams, id=rating_key, file='/media/%s.mkv' % path, size=rnd.randint(10 ** 8, 10 ** 10))
+        return _tag('Media', part, id=rating_key, videoCodec=video, audioCodec=audio, videoResolution=rnd.choice(['sd', '720', '1080']))
+
+    def tags(self, rnd, detail):
+        children = ''.join(_tag('Genre', tag=x) for x in rnd.sample(GENRES, 3 if detail else 2))
+        children += _tag('Country', tag=rnd.choice(COUNTRIES))
+        children += _tag('Director', tag='Director %d' % rnd.randint(0, 500))
+        if detail:
+            children += ''.join(_tag('Writer', tag='Writer %d' % rnd.randint(0, 900)) for _ in range(2))
+            children += _tag('Producer', tag='Producer %d' % rnd.randint(0, 900))
+            children += ''.join(_tag('Role', tag='Actor %d' % n, role='Role %d' % i, thumb='/library/people/%d/thumb' % n)
+                                for i, n in enumerate(rnd.sample(range(5000), self.roles)))
+        return children
+
+    def movie(self, rating_key, offset, detail=False):
+        rnd = random.Random(self.seed * 1000003 + rating_key)
+        attrs = self.common(rating_key, rnd, 'movie', self.title(rating_key))
+        attrs.update({
+            'key': '/library/metadata/%d' % rating_key,
+            'year': 1950 + rnd.randint(0, 70),
+            'rating': '%.1f' % rnd.uniform(1, 10),
+            'duration': rnd.randint(60, 180) * 60000,
+            'art': '/library/metadata/%d/art/%d' % (rating_key, self.updated_at(rating_key)),
+        })
+        children = self.media(rating_key, rnd, detail, 'movies/Movie %d' % rating_key) + self.tags(rnd, detail)
+        return _tag('Video', children, **attrs)
+
+    def directory(self, rating_key, offset, detail, kind):
+        rnd = random.Random(self.seed * 1000003 + rating_key)
+        attrs = self.common(rating_key, rnd, kind, self.title(rating_key))
+        attrs.update({
+            'key': '/library/metadata/%d/children' % rating_key,
+            'childCount': len(self.child_keys(rating_key)),
+        })
+        if kind in ('season', 'album'):
+            attrs['index'] = offset % self.children[PARENTS[KIND_INDEX[kind]]] + 1
+        children = ''.join(_tag('Genre', tag=x) for x in rnd.sample(GENRES, 2)) if kind in ('show', 'artist') else ''
+        return _tag('Directory', children, **attrs)
+
+    def show(self, rating_key, offset, detail=False):
+        return self.directory(rating_key, offset, detail, 'show')
+
+    def season(self, rating_key, offset, detail=False):
+        return self.directory(rating_key, offset, detail, 'season')
+
+    def artist(self, rating_key, offset, detail=False):
+        return self.directory(rating_key, offset, detail, 'artist')
+
+    def album(self, rating_key, offset, detail=False):
+        return self.directory(rating_key, offset, detail, 'album')
+
+    def episode(self, rating_key, offset, detail=False):
+        rnd = random.Random(self.seed * 1000003 + rating_key)
+        attrs = self.common(rating_key, rnd, 'episode', self.title(rating_key))
+        attrs.update({
+            'key': '/library/metadata/%d' % rating_key,
+            'index': offset % self.children[SEASON] + 1,
+            'parentIndex': (offset // self.children[SEASON]) % self.children[SHOW] + 1,
+            'duration': rnd.randint(20, 60) * 60000,
+        })
+        children = self.media(rating_key, rnd, detail, 'tv/%d' % rating_key)
+        if detail:
+            children += _tag('Writer', tag='Writer %d' % rnd.randint(0, 900)) + _tag('Director', tag='Director %d' % rnd.randint(0, 500))
+        return _tag('Video', children, **attrs)
+
+    def track(self, rating_key, offset, detail=False):
+        rnd = random.Random(self.seed * 1000003 + rating_key)
+        attrs = self.common(rating_key, rnd, 'track', self.title(rating_key))
+        attrs.update({
+            'key': '/library/metadata/%d' % rating_key,
+            'index': offset % self.children[ALBUM] + 1,
+            'duration': rnd.randint(120, 480) * 1000,
+        })
+        part = _tag('Part', id=rating_key, file='/media/music/%d.flac' % rating_key, size=rnd.randint(10 ** 6, 10 ** 8))
+        children = _tag('Media', part, id=rating_key, audioCodec='flac', audioChannels=2)
+        if detail:
+            children += _tag('Genre', tag=rnd.choice(GENRES))
+        return _tag('Track', children, **attrs)
+
+    def listing(self, kind, start, end):
+        return ''.join(self.element(self.rating_key(kind, offset)) for offset in range(start, end))
+
+    def container(self, body='', **kwargs):
+        return '<?xml version="1.0" encoding="UTF-8"?><MediaContainer %s>%s</MediaContainer>' % (_attrs(**kwargs), body)
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def library(self):
+        return self.server.library
+
+    def do_GET(self):
+        self.server.count(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        path = parse.urlsplit(self.path)[2].rstrip('/') or '/'
+        for pattern, method in ROUTES:
+            match = pattern.match(path)
+            if match:
+                return getattr(self, method)(*match.groups())
+        self.send_error(404)
+
+    def send_body(self, body, content_type='text/xml;charset=utf-8'):
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunks(self, chunks):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml;charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in chunks:
+            chunk = chunk.encode('utf-8')
+            if chunk:
+                self.wfile.write(('%x\r\n' % len(chunk)).encode('ascii'))
+                self.wfile.write(chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def root(self):
+        body = _tag('Directory', key='library', title='library') + _tag('Directory', key='servers', title='servers')
+        self.send_body(self.library.container(body, friendlyName=self.server.name, machineIdentifier=self.server.machine_identifier, version='1.0.0'))
+
+    def servers(self):
+        servers = [self.server] + self.server.peers
+        body = ''.join(_tag('Server', name=server.name, host=server.server_address[0], address=server.server_address[0],
+                            port=server.server_address[1], machineIdentifier=server.machine_identifier, version='1.0.0')
+                       for server in servers)
+        self.send_body(self.library.container(body, size=len(servers)))
+
+    def library_root(self):
+        body = _tag('Directory', key='sections', title='Library Sections') + _tag('Directory', key='recentlyAdded', title='Recently Added Content')
+        self.send_body(self.library.container(body, title1='Plex Library'))
+
+    def sections(self):
+        body = ''.join(_tag('Directory', key=key, type=kind, title=title, updatedAt=self.library.section_updated_at(key))
+                       for key, kind, title, top, leaf in self.library.sections())
+        self.send_body(self.library.container(body, size=len(self.library.sections()), title1='Plex Library'))
+
+    def section(self, key):
+        section = self.library.section(key)
+        if section is None:
+            return self.send_error(404)
+        body = _tag('Directory', key='all', title='All %s' % section[2]) + _tag('Directory', key='unwatched', title='Unwatched')
+        if section[4] is not None:
+            body += _tag('Directory', key='allLeaves', title='All Leaves')
+        self.send_body(self.library.container(body, viewGroup='secondary', title1=section[2]))
+
+    def section_all(self, key):
+        section = self.library.section(key)
+        if section is None:
+            return self.send_error(404)
+        query = dict(parse.parse_qsl(parse.urlsplit(self.path)[3]))
+        kind = section[3]
+        if 'type' in query:
+            kind = PLEX_TYPES.get(query['type'], None)
+            if kind is None or not section[3] <= kind <= (section[4] or section[3]):
+                return self.send_error(400)
+        self.send_listing(kind, section[2])
+
+    def section_leaves(self, key):
+        section = self.library.section(key)
+        if section is None or section[4] is None:
+            return self.send_error(404)
+        self.send_listing(section[4], section[2])
+
+    def send_listing(self, kind, title):
+        total = self.library.count(kind)
+        start = int(self.headers.get('X-Plex-Container-Start', 0))
+        size = int(self.headers.get('X-Plex-Container-Size', total))
+        end = min(total, start + size)
+        attrs = {'viewGroup': KIND_NAMES[kind], 'size': max(0, end - start), 'title1': title}
+        if 'X-Plex-Container-Start' in self.headers:
+            attrs.update(totalSize=total, offset=start)
+        head, tail = self.library.container('|', **attrs).split('|')
+
+        def chunks():
+            yield head
+            for offset in range(start, end, CHUNK_ITEMS):
+                yield self.library.listing(kind, offset, min(end, offset + CHUNK_ITEMS))
+            yield tail
+        self.send_chunks(chunks())
+
+    def recently_added(self):
+        library = self.library
+        keys = sorted(library.updated, key=library.updated_at, reverse=True)
+        keys += [library.rating_key(MOVIE, x) for x in range(library.movies - 1, -1, -1)]
+        keys = [key for offset, key in enumerate(keys) if key not in keys[:offset]][:50]
+        self.send_body(library.container(''.join(library.element(key) or '' for key in keys), size=len(keys)))
+
+    def metadata(self, keys):
+        elements = [self.library.element(int(x), detail=True) for x in keys.split(',')]
+        elements = [x for x in elements if x]
+        self.send_body(self.library.container(''.join(elements), size=len(elements)))
+
+    def children(self, key):
+        keys = self.library.child_keys(int(key))
+        if not keys:
+            return self.send_error(404)
+        self.send_body(self.library.container(''.join(self.library.element(x) for x in keys), size=len(keys), key=key))
+
+    def image(self, *args):
+        self.send_body(self.library.image(), 'image/png')
+
+
+ROUTES = [(re.compile(pattern), method) for pattern, method in [
+    (r'^/$', 'root'),
+    (r'^/servers$', 'servers'),
+    (r'^/library$', 'library_root'),
+    (r'^/library/sections$', 'sections'),
+    (r'^/library/sections/(\d+)$', 'section'),
+    (r'^/library/sections/(\d+)/all$', 'section_all'),
+    (r'^/library/sections/(\d+)/allLeaves$', 'section_leaves'),
+    (r'^/library/recentlyAdded$', 'recently_added'),
+    (r'^/library/metadata/(\d+(?:,\d+)*)$', 'metadata'),
+    (r'^/library/metadata/(\d+)/children$', 'children'),
+    (r'^/library/metadata/\d+/(?:thumb|art)/\d+$', 'image'),
+    (r'^/library/people/\d+/thumb$', 'image'),
+    (r'^/photo/:/transcode$', 'image'),
+]]
+
+
+class FakePlexServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, library=None, latency=0.0, address=('127.0.0.1', 0), name='Fake Plex'):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.library = library or Library()
+        self.latency = latency
+        self.name = name
+        self.machine_identifier = re.sub(r'\W+', '-', name.lower())
+        self.peers = []
+        self.requests = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d/' % self.server_address[:2]
+
+    def count(self, path):
+        with self._lock:
+            self.requests.append(path)
+
+    def reset(self):
+        with self._lock:
+            self.requests = []
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve a synthetic plex library for testing and benchmarking")
+    parser.add_argument('-n', '--items', type=int, default=1000, help="Number of movies in the library (default: %(default)s)")
+    parser.add_argument('--shows', type=int, default=0, help="Number of tv shows in the library (default: %(default)s)")
+    parser.add_argument('--artists', type=int, default=0, help="Number of music artists in the library (default: %(default)s)")
+    parser.add_argument('-l', '--latency', type=float, default=0.0, help="Delay in seconds added to every response (default: %(default)s)")
+    parser.add_argument('-p', '--port', type=int, default=32400, help="Port to listen on (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the generated metadata (default: %(default)s)")
+    options = parser.parse_args(argv)
+    server = FakePlexServer(Library(movies=options.items, shows=options.shows, artists=options.artists, seed=options.seed), latency=options.latency, address=('127.0.0.1', options.port))
+    print("Serving %d movies on %s" % (options.items, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+from __future__ import unicode_literals, absolute_import
+
+import gc
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+import plex_export
+from plex_export import PlexServer, export
+from plex_export.plex.base import DEFAULT_BATCH_SIZE, ET
+from plex_export.plex.datatypes import VideoItem
+
+from .fakeplex import FakePlexServer, Library
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+TEMPLATE_DIR = os.path.join(BENCHMARK_DIR, 'templates')
+MOVIES_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(plex_export.__file__)), 'templates', 'movies.txt')
+
+LOOKUP_TAGS = ['Genre', 'Role', 'Writer', 'Producer', 'Country', 'Media', 'title']
+LOOKUP_ROUNDS = 1000
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    BENCHMARKS.append((func.__name__[len('bench_'):], func))
+    return func
+
+
+@contextmanager
+def quiet():
+    stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+
+
+def movies(plex):
+    return plex.library.sections.movie.all
+
+
+@benchmark
+def bench_plex_load(url, options, tmpdir):
+    PlexServer(url).load()
+
+
+@benchmark
+def bench_section_walk(url, options, tmpdir):
+    plex = PlexServer(url, page_size=options.page_size)
+    for movie in movies(plex):
+        pass
+
+
+@benchmark
+def bench_section_walk_detail(url, options, tmpdir):
+    plex = PlexServer(url, batch_size=options.batch_size, workers=options.workers, page_size=options.page_size)
+    for movie in movies(plex):
+        movie.Writer
+
+
+def measure_memory(url, options, **kwargs):
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        listing = movies(PlexServer(url, workers=options.workers, page_size=options.page_size, **kwargs)).hydrate(options.batch_size)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'memory': current, 'memory_peak': peak, 'memory_per_item': current // max(1, len(listing))}
+
+
+@benchmark
+def bench_memory(url, options, tmpdir):
+    return measure_memory(url, options)
+
+
+@benchmark
+def bench_memory_lean(url, options, tmpdir):
+    return measure_memory(url, options, lean=True)
+
+
+@benchmark
+def bench_tag_lookups(url, options, tmpdir):
+    library = Library(roles=500)
+    element = ET.fromstring(library.element(1, detail=True).encode('utf-8'))
+    movie = VideoItem(PlexServer(url), None, element)
+    movie.load_from(movie.process_detail(element))
+    for _ in range(LOOKUP_ROUNDS):
+        for tag in LOOKUP_TAGS:
+            movie.get(tag)
+
+
+@benchmark
+def bench_render_movies(url, options, tmpdir):
+    with quiet():
+        export([url, MOVIES_TEMPLATE, os.path.join(tmpdir, 'movies.txt'), '-o', 'show_staff=1',
+                '-b', str(options.batch_size), '-w', str(options.workers)])
+
+
+@benchmark
+def bench_render_listing(url, options, tmpdir):
+    with quiet():
+        export([url, os.path.join(TEMPLATE_DIR, 'listing.txt'), os.path.join(tmpdir, 'listing.txt'),
+                '-b', str(options.batch_size), '-w', str(options.workers)])
+
+
+@benchmark
+def bench_render_shows(url, options, tmpdir):
+    with quiet():
+        export([url, os.path.join(TEMPLATE_DIR, 'shows.txt'), os.path.join(tmpdir, 'shows.txt'),
+                '-b', str(options.batch_size), '-w', str(options.workers)])
+
+
+@benchmark
+def bench_inline_images(url, options, tmpdir):
+    with quiet():
+        export([url, os.path.join(TEMPLATE_DIR, 'posters.html'), os.path.join(tmpdir, 'posters.html'),
+                '-b', str(options.batch_size), '-w', str(options.workers), '--prefetch-images'])
+
+
+def git_revision():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def run_benchmark(server, func, options):
+    timings, requests, extra = [], 0, None
+    for _ in range(options.repeat):
+        tmpdir = tempfile.mkdtemp()
+        server.reset()
+        try:
+            started = time.time()
+            extra = func(server.url, options, tmpdir)
+            timings.append(time.time() - started)
+        finally:
+            shutil.rmtree(tmpdir)
+        requests = len(server.requests)
+    timings.sort()
+    return dict({
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'requests': requests,
+    }, **(extra or {}))
+
+
+def previous_results(path, items, latency):
+    candidates = [x for x in glob.glob(os.path.join(os.path.dirname(os.path.abspath(path)), '*.json')) if os.path.abspath(x) != os.path.abspath(path)]
+    for candidate in sorted(candidates, key=os.path.getmtime, reverse=True):
+        with open(candidate) as fh:
+            data = json.load(fh)
+        for run in data['runs']:
+            if run['items'] == items and run['latency'] == latency:
+                return data['version'], run['results']
+    return None, {}
+
+
+def format_change(current, previous, key='median'):
+    if not previous or not previous.get(key, None):
+        return ''
+    return '%+.1f%%' % ((current[key] - previous[key]) / float(previous[key]) * 100)
+
+
+def format_memory(current, previous):
+    if 'memory' not in current:
+        return ''
+    return '  %.1f MB, %d bytes per item %s' % (current['memory'] / 1048576.0, current['memory_per_item'],
+                                                format_change(current, previous, 'memory'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark plex-export against a synthetic plex library")
+    parser.add_argument('-n', '--items', type=int, nargs='+', default=[1000], help="Library sizes to benchmark (default: %(default)s)")
+    parser.add_argument('--shows', type=int, default=20, help="Number of tv shows in the library (default: %(default)s)")
+    parser.add_argument('-l', '--latency', type=float, default=0.0, help="Delay in seconds added to every response (default: %(default)s)")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Number of runs per benchmark (default: %(default)s)")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="Workers passed to benchmarks that support them (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Batch size used when loading item details (default: %(default)s)")
+    parser.add_argument('--page-size', type=int, default=None, help="Page size used when walking sections")
+    parser.add_argument('-b', '--benchmark', action='append', dest='benchmarks', choices=[name for name, func in BENCHMARKS],
+                        help="Only run the given benchmark, can be specified multiple times")
+    parser.add_argument('-o', '--output', default=None, help="File to record the results in (default: results/<version>.json)")
+    parser.add_argument('--no-save', action='store_false', dest='save', default=True, help="Don't record the results")
+    options = parser.parse_args(argv)
+
+    revision = git_revision()
+    version = plex_export.__version__ + ('-%s' % revision if revision else '')
+    output = options.output or os.path.join(RESULTS_DIR, '%s.json' % version)
+    selected = [(name, func) for name, func in BENCHMARKS if not options.benchmarks or name in options.benchmarks]
+    runs = []
+    for items in options.items:
+        previous_version, previous = previous_results(output, items, options.latency)
+        print("%d items, %.3fs latency%s" % (items, options.latency, ' (compared to %s)' % previous_version if previous_version else ''))
+        results = {}
+        with FakePlexServer(Library(movies=items, shows=options.shows), latency=options.latency) as server:
+            for name, func in selected:
+                result = results[name] = run_benchmark(server, func, options)
+                print("  %-24s %8.3fs %8.3fs %8d requests %10s%s" % (name, result['min'], result['median'], result['requests'],
+                                                                     format_change(result, previous.get(name)),
+                                                                     format_memory(result, previous.get(name))))
+        runs.append({'items': items, 'latency': options.latency, 'results': results})
+
+    if options.save:
+        if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+            os.makedirs(os.path.dirname(os.path.abspath(output)))
+        data = {
+            'version': version,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'timestamp': int(time.time()),
+            'repeat': options.repeat,
+            'workers': options.workers,
+            'runs': runs,
+        }
+        with open(output, 'w') as fh:
+            json.dump(data, fh, indent=2, sort_keys=True)
+        print("Results written to %s" % output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+from __future__ import unicode_literals, absolute_import
+
+import six
+from jinja2 import meta, nodes
+
+from .plex.base import BaseDirectory
+from .plex.datatypes import VideoItem, RoleItem, ShowItem, SeasonItem, ArtistItem, AlbumItem, TrackItem
+from .plex.util import ImgHelper
+
+# Filters that read the given attribute of every item they are passed
+ATTRIBUTE_FILTERS = frozenset(['sort', 'groupby', 'map', 'selectattr', 'rejectattr', 'sum', 'unique', 'min', 'max', 'attr'])
+# Filters that only look at an item itself, never at its fields
+PLAIN_FILTERS = frozenset(['length', 'count', 'string', 'e', 'escape', 'safe', 'default', 'd', 'tojson', 'pprint'])
+# Python attributes of items that never hand out other fields of the item
+SAFE_ATTRIBUTES = frozenset(['thumb', 'art', 'value', 'url', 'has_token', 'is_search', 'indices', 'seasons', 'episodes', 'albums',
+                             'tracks'])
+IMAGE_ATTRIBUTES = frozenset(['thumb', 'art'])
+# Attributes of the groups handed out by the groupby filter
+GROUP_ATTRIBUTES = frozenset(['grouper', 'list'])
+# Context variables holding plex servers rather than items
+SERVER_VARIABLES = frozenset(['servers'])
+
+__all__ = [
+    'TemplateAnalysis',
+    'analyze_template',
+]
+
+
+def python_attributes():
+    names = set()
+    for cls in (VideoItem, RoleItem, ShowItem, SeasonItem, ArtistItem, AlbumItem, TrackItem, ImgHelper):
+        names.update(x for x in dir(cls) if not x.startswith('_'))
+    return names - IMAGE_ATTRIBUTES
+
+
+def _walk(node, ancestors=()):
+    yield node, ancestors
+    for child in node.iter_child_nodes():
+        for pair in _walk(child, (node,) + ancestors):
+            yield pair
+
+
+def _const_string(node):
+    if isinstance(node, nodes.Const) and isinstance(node.value, six.string_types):
+        return node.value
+    return None
+
+
+def _accessed_name(node):
+    if isinstance(node, nodes.Getattr):
+        return node.attr
+    if isinstance(node, nodes.Getitem):
+        return _const_string(node.arg)
+    return None
+
+
+def _loop_targets(target):
+    if isinstance(target, nodes.Name):
+        return [target.name]
+    if isinstance(target, nodes.Tuple):
+        return [name for item in target.items for name in _loop_targets(item)]
+    return []
+
+
+class TemplateAnalysis(object):
+    def __init__(self, name):
+        self.name = name
+        self.templates = []
+        self.fields = set()
+        # Sections the template reaches by title, key or type, None when it reaches them in a way that can not be told
+        self.sections = set()
+        self.reasons = []
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.name)
+
+    @property
+    def dynamic(self):
+        return bool(self.reasons)
+
+    def describe(self):
+        if self.dynamic:
+            return "%s: unable to tell which fields are used (%s), details are loaded as before" % (self.name, '; '.join(self.reasons))
+        return "%s: items are read for %s" % (self.name, ', '.join(sorted(self.fields)) or 'nothing')
+
+    def add_field(self, name):
+        self.fields.add(name.split('.', 1)[0])
+
+    def visit_sections(self, node, parent):
+        if _accessed_name(node) != 'sections':
+            return
+        name = _accessed_name(parent) if getattr(parent, 'node', None) is node else None
+        if name is None or hasattr(BaseDirectory, name):
+            self.sections = None
+        elif self.sections is not None:
+            self.sections.add(name)
+
+    def visit(self, template, ast, variables):
+        opaque = python_attributes() - SAFE_ATTRIBUTES
+        for node, ancestors in _walk(ast):
+            parent = ancestors[0] if ancestors else None
+            self.visit_sections(node, parent)
+            if isinstance(node, nodes.Filter) and node.name in ATTRIBUTE_FILTERS:
+                self.visit_filter(node)
+            if isinstance(node, nodes.Name) and node.ctx == 'load' and node.name in variables:
+                self.visit_variable(template, node, ancestors, opaque)
+
+    def visit_filter(self, node):
+        for arg in list(node.args) + [x.value for x in node.kwargs if x.key == 'attribute']:
+            value = _const_string(arg)
+            if value:
+                self.add_field(value)
+
+    def visit_variable(self, template, node, ancestors, opaque):
+        parent = ancestors[0] if ancestors else None
+        if isinstance(parent, (nodes.Getattr, nodes.Getitem)) and parent.node is node:
+            self.visit_lookup(template, node, ancestors, opaque)
+        elif isinstance(parent, nodes.Filter) and parent.node is node:
+            if parent.name not in PLAIN_FILTERS and parent.name not in ATTRIBUTE_FILTERS:
+                self.reasons.append("%s passes %s to the %s filter" % (template, node.name, parent.name))
+        elif isinstance(parent, nodes.For) and parent.iter is node:
+            self.reasons.append("%s loops over the children of %s" % (template, node.name))
+        elif isinstance(parent, nodes.CondExpr) and parent.test is not node:
+            self.reasons.append("%s passes %s on" % (template, node.name))
+        elif isinstance(parent, (nodes.Call, nodes.Filter, nodes.Getitem, nodes.Assign, nodes.With, nodes.Keyword, nodes.Pair,
+                                 nodes.List, nodes.Tuple, nodes.Dict)):
+            self.reasons.append("%s passes %s on" % (template, node.name))
+
+    def visit_lookup(self, template, node, ancestors, opaque):
+        parent = ancestors[0]
+        name = _accessed_name(parent)
+        if isinstance(parent, nodes.Getattr) and name in opaque:
+            self.reasons.append("%s uses %s.%s" % (template, node.name, name))
+        elif name is not None:
+            self.add_field(name)
+            self.visit_chain(name, parent, ancestors[1:])
+        elif not isinstance(parent.arg, nodes.Const):
+            self.reasons.append("%s looks up a computed key on %s" % (template, node.name))
+
+    def visit_chain(self, name, expression, ancestors):
+        # Child tags are read further down the expression too, e.g. Part and Stream in movie.Media[0].Part[0].Stream
+        for ancestor in ancestors:
+            if not name[:1].isupper() or not isinstance(ancestor, (nodes.Getattr, nodes.Getitem)) or ancestor.node is not expression:
+                return
+            value = _accessed_name(ancestor)
+            if value is not None:
+                name = value
+                self.add_field(name)
+            expression = ancestor
+
+
+def analyze_template(env, name, variables=()):
+    analysis = TemplateAnalysis(name)
+    pending, trees = [name], []
+    while pending:
+        template = pending.pop()
+        if template in analysis.templates:
+            continue
+        analysis.templates.append(template)
+        source = env.loader.get_source(env, template)[0]
+        ast = env.parse(source, template)
+        trees.append((template, ast))
+        for reference in meta.find_referenced_templates(ast):
+            if reference is None:
+                analysis.reasons.append("%s loads a template chosen at runtime" % template)
+            else:
+                pending.append(env.join_path(reference, template))
+    variables = set(variables)
+    for template, ast in trees:
+        for loop in ast.find_all(nodes.For):
+            if not (isinstance(loop.iter, nodes.Name) and loop.iter.name in SERVER_VARIABLES):
+                variables.update(_loop_targets(loop.target))
+    for template, ast in trees:
+        analysis.visit(template, ast, variables)
+    analysis.fields -= python_attributes() | GROUP_ATTRIBUTES
+    return analysis
@@ -7,3 +7,7 @@ class InvalidTokenException(Exception):
 
 class TokenRequiredException(Exception):
     pass
+
+
+class NotInSnapshotException(Exception):
+    pass
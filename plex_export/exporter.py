@@ -1,12 +1,28 @@
 from __future__ import unicode_literals, absolute_import, print_function
 
 import os
+import sys
+import json
+import time
+import string
 import argparse
+import threading
+import multiprocessing
+from collections import deque
 from os.path import abspath
-from jinja2 import Environment, FileSystemLoader, ChoiceLoader, PackageLoader
+from jinja2 import Environment, FileSystemLoader, ChoiceLoader, PackageLoader, FileSystemBytecodeCache
 from datetime import datetime
+from six.moves.urllib import parse
 
 from . import PlexServer
+from . import exceptions
+from .analysis import analyze_template
+from .output import OutputWriter, AssetWriter, DEFAULT_FLUSH_SIZE, DEFAULT_ASSET_WORKERS
+from .plex.base import collect_images, prefetch, prefetch_images, item_element, item_from_element, crawl_listing, find_sections, _run_pool
+from .plex.base import DEFAULT_BATCH_SIZE, ET
+from .plex.merged import MergedCollection
+from .plex.snapshot import Snapshot, SnapshotPlexServer, record
+from .watch import Watcher, DEFAULT_INTERVAL, DEFAULT_DEBOUNCE
 
 try:
     from .version_info import __version__
@@ -31,21 +47,76 @@ class KeyValueOption(argparse.Action):
         container[k] = v
 
 
-parser = argparse.ArgumentParser(description='Exports your current library to a template html file.')
+def add_connection_arguments(group):
+    group.add_argument('-c', '--cache', action='store', dest='cache', choices=['sqlite', 'memory'], default=None, required=False, help='Cache requests using this method (memory is not suggested)')
+    group.add_argument('-C', '--cachetime', action='store', dest='cachetime', type=int, default=None, required=False, help='Cache requests for CACHETIME seconds unless a more specific --cache-ttl applies. Without it, item details are cached for a day, section listings for a minute, sessions for 10 seconds and everything else for 300 seconds.')
+    group.add_argument('--cache-path', action='store', dest='cache_path', default=None, help='Store the sqlite cache in CACHE_PATH instead of request-cache.sqlite')
+    group.add_argument('--cache-size', action='store', dest='cache_size', type=int, default=None, help='Keep at most CACHE_SIZE bytes of responses in memory')
+    group.add_argument('--cache-stale', action='store', dest='cache_stale', type=int, default=0, help='Serve expired responses for up to CACHE_STALE seconds while they are refreshed in the background')
+    group.add_argument('--cache-ttl', action=KeyValueOption, dest='cache_ttls', help='Cache responses for paths matching the regular expression PATTERN for SECONDS, in the format PATTERN=SECONDS. This option can be specified multiple times.')
+    group.add_argument('-b', '--batch-size', action='store', dest='batch_size', type=int, default=DEFAULT_BATCH_SIZE, help='Fetch the details of BATCH_SIZE items per request when a template iterates a section. Use 0 to load every item on its own.')
+    group.add_argument('-w', '--workers', action='store', dest='workers', type=int, default=1, help='Perform up to WORKERS requests concurrently and report the achieved request rate')
+    group.add_argument('--per-host', action='store', dest='per_host', type=int, default=None, help='Limit the number of concurrent connections to a single host to PER_HOST')
+
+
+parser = argparse.ArgumentParser(description='Exports your current library to a template html file.', epilog='Run "plex-export snapshot --help" or "plex-export warm --help" for the other commands.')
 parser.add_argument('--version', action='version', version='%%(prog)s version %s' % __version__)
+parser.add_argument('-v', '--verbose', action='store_true', dest='verbose', help='Report which item fields the template uses and whether item details had to be loaded')
 group = parser.add_argument_group("Input/Output")
 group.add_argument('plexurl', help='Url to your plex server. Optionally add ?X-Plex-Token=<token> if your plex server requires auth.')
 group.add_argument('template', help='Path to the template to parse. The directory of this file will be added to the list of template directories unless --builtin is specified')
-group.add_argument('outfile', nargs='?', type=argparse.FileType('w'))
-group.add_argument('-c', '--cache', action='store', dest='cache', choices=['sqlite', 'memory'], default=None, required=False, help='Cache requests using this method (memory is not suggested)')
-group.add_argument('-C', '--cachetime', action='store', dest='cachetime', type=int, default=300, required=False, help='Cache requests for CACHETIME seconds')
+group.add_argument('outfile', nargs='?', help='File to write the rendered template to. Defaults to standard output.')
+group.add_argument('-t', '--template', action='append', dest='renders', default=[], metavar='TEMPLATE=OUTFILE', help='Also render TEMPLATE to OUTFILE from the same library data. The templates are rendered concurrently. This option can be specified multiple times.')
+group.add_argument('--shard', action='store', dest='shard', metavar='PATTERN', default=None, help='Render the template once per item of a section, to files named by PATTERN with item fields in braces, e.g. "out/{ratingKey}.html". The template gets the item as "item". Files whose content did not change are left untouched.')
+group.add_argument('--shard-section', action='store', dest='shard_section', default='movie', help='Render the items of the section with this title, key or type when using --shard (default: %(default)s)')
+group.add_argument('--server', action='append', dest='servers', default=[], metavar='PLEXURL', help='Also export the plex server at PLEXURL, which is loaded concurrently with the others. Templates get every server as "servers" and all of them combined as "merged". This option can be specified multiple times.')
+group.add_argument('--all-servers', action='store_true', dest='all_servers', help='Also export every other server listed by the first server')
+group.add_argument('--atomic', action='store_true', dest='atomic', help='Write the output to a temporary file and move it into place once rendering has finished')
+group.add_argument('--assets-dir', action='store', dest='assets_dir', default=None, help='Write images as separate files to ASSETS_DIR and link to them instead of embedding them in the output')
+group.add_argument('--flush-size', action='store', dest='flush_size', type=int, default=DEFAULT_FLUSH_SIZE, help='Write the output in chunks of at least FLUSH_SIZE characters while rendering')
+group.add_argument('--from-snapshot', action='store_true', dest='from_snapshot', help='Treat PLEXURL as the path to a snapshot created with "plex-export snapshot" and render without contacting the server')
+group.add_argument('--incremental', action='store', dest='incremental', default=None, help='Keep item details in the INCREMENTAL state file, only fetch items that changed since the previous run and leave the output untouched when its content did not change')
+group.add_argument('--image-cache', action='store', dest='image_cache', default=None, help='Store downloaded images in IMAGE_CACHE so later exports do not download unchanged artwork again')
+group.add_argument('--prefetch-images', action='store_true', dest='prefetch_images', help='Determine which images the template uses and download them concurrently before rendering')
+group = parser.add_argument_group("Watching")
+group.add_argument('--watch', action='store_true', dest='watch', help='Keep running after the export, poll the server for library changes and render again when something changed. Only the changed items are loaded again.')
+group.add_argument('--interval', action='store', dest='interval', type=float, default=DEFAULT_INTERVAL, help='Poll for changes every INTERVAL seconds when using --watch (default: %(default)s)')
+group.add_argument('--debounce', action='store', dest='debounce', type=float, default=DEFAULT_DEBOUNCE, help='Wait until the library did not change for DEBOUNCE seconds before rendering again (default: %(default)s)')
+group.add_argument('--polls', action='store', dest='polls', type=int, default=None, help='Stop watching after POLLS polls')
 group = parser.add_argument_group("Template configuration")
 group.add_argument('-d', '--dir', action='append', dest='dirnames', default=[], help='Add DIRNAMES to the list of template directories. Useful when extending or including other templates. This option can be specified multiple times.')
 group.add_argument('-p', '--package', action='append', dest='packages', default=[], help='Add PACKAGES to the list of python packages to search for templates. Please note that the "templates" directory under each package is searched in. This option can be specified multiple times.')
 group.add_argument('-f', '--follow-symlinks', action='store_true', dest='symlinks', help='Tell the template loader to follow symlinks')
 group.add_argument('--relative', action='store_true', dest='relative', help='Assume that <template> is relative to the built-in template folders')
 group.add_argument('--use-builtin-folders', action='store_true', dest='builtin_templates', help='Include the standard built-in folders')
+group.add_argument('--bytecode-cache', action='store', dest='bytecode_cache', default=None, help='Store compiled templates in BYTECODE_CACHE so later runs do not compile unchanged templates again')
+group.add_argument('--no-field-analysis', action='store_false', dest='analyze', help='Always load item details instead of deciding from the fields the template uses')
 group.add_argument('-o', '--option', action=KeyValueOption, dest='options', help='Define variables to be passed directly to the template in the format key=value. This option can be specified multiple times.')
+group = parser.add_argument_group("Performance")
+add_connection_arguments(group)
+group.add_argument('--stats', action='store_true', dest='stats', help='Report request, cache, parsing and rendering statistics when done')
+group.add_argument('--stats-json', action='store', dest='stats_json', default=None, help='Write the statistics as JSON to STATS_JSON')
+group.add_argument('--page-size', action='store', dest='page_size', type=int, default=None, help='Request listings in pages of PAGE_SIZE items, fetching the remaining pages concurrently when --workers is given')
+group.add_argument('--stream', action='store_true', dest='stream', help='Parse section listings incrementally while they are downloaded instead of keeping them in memory')
+group.add_argument('--lean', action='store_true', dest='lean', help='Release parsed XML as soon as it has been processed, keeping only the object tree in memory')
+group.add_argument('--async', action='store_true', dest='use_async', help='Load the library and render the template using asyncio (requires Python 3.6+ and aiohttp)')
+group.add_argument('--inflight', action='store', dest='inflight', type=int, default=100, help='Allow up to INFLIGHT concurrent requests when using --async')
+group.add_argument('--processes', action='store', dest='processes', type=int, default=None, help='Render --shard output in PROCESSES processes. Defaults to the number of cpus.')
+
+snapshot_parser = argparse.ArgumentParser(prog='plex-export snapshot', description='Stores your current library in a snapshot file that can be rendered with --from-snapshot.')
+group = snapshot_parser.add_argument_group("Input/Output")
+group.add_argument('plexurl', help='Url to your plex server. Optionally add ?X-Plex-Token=<token> if your plex server requires auth.')
+group.add_argument('snapshot', help='Path of the snapshot file to create. An existing snapshot is replaced once the new one is complete.')
+group = snapshot_parser.add_argument_group("Performance")
+add_connection_arguments(group)
+
+warm_parser = argparse.ArgumentParser(prog='plex-export warm', description='Fills the request cache ahead of an export, refreshing entries that are about to expire. Use the same cache and batch size options as the export itself.')
+group = warm_parser.add_argument_group("Input/Output")
+group.add_argument('plexurl', help='Url to your plex server. Optionally add ?X-Plex-Token=<token> if your plex server requires auth.')
+group.add_argument('-s', '--section', action='append', dest='sections', default=[], help='Only warm the section with this title, key or type. This option can be specified multiple times.')
+group.add_argument('-a', '--ahead', action='store', dest='ahead', type=int, default=600, help='Refresh cache entries that expire within AHEAD seconds, and store what is warmed for at least AHEAD seconds')
+group = warm_parser.add_argument_group("Performance")
+add_connection_arguments(group)
 
 
 DEFAULT_EXTENSIONS = [
@@ -53,19 +124,32 @@ DEFAULT_EXTENSIONS = [
     'jinja2.ext.with_',
     'jinja2.ext.autoescape',
 ]
+SHARD_VARIABLES = ['item']
+SHARD_CHUNK_SIZE = 50
+
+# Environments are kept for the lifetime of the process, so repeated exports reuse compiled templates
+_environments = {}
+_environments_lock = threading.Lock()
+
 
+def template_names(options, templates):
+    names, dirnames = [], []
+    for tpl in templates:
+        if not options.relative:
+            path = abspath(os.path.expanduser(tpl))
+            if not os.path.exists(path):
+                parser.error("input file '%s' does not exist" % tpl)
+            dname, tpl = os.path.split(path)
+            if dname not in dirnames:
+                dirnames.append(dname)
+        names.append(tpl)
+    if len(set(names)) < len(set(templates)):
+        parser.error("templates from different directories need different file names")
+    return dirnames, names
 
-def get_loader(options):
-    tpl = options.template
-    loaders = []
-    if not options.relative:
-        if '~' in tpl:
-            tpl = os.path.expanduser(tpl)
-        tpl = abspath(options.template)
-        if not os.path.exists(tpl):
-            parser.error("input file '%s' does not exist" % options.template)
-        dname, tpl = os.path.split(tpl)
-        loaders.append(FileSystemLoader(dname, followlinks=options.symlinks))
+
+def get_loader(options, dirnames):
+    loaders = [FileSystemLoader(dname, followlinks=options.symlinks) for dname in dirnames]
 
     if options.dirnames:
         loaders.append(FileSystemLoader([abspath(path) for path in options.dirnames]))
@@ -73,36 +157,410 @@ def get_loader(options):
         loaders.append(ChoiceLoader([PackageLoader(package) for package in options.packages]))
     if options.builtin_templates:
         loaders.append(PackageLoader('plex_export'))
-    return ChoiceLoader(loaders), tpl
+    return ChoiceLoader(loaders)
+
+
+def get_bytecode_cache(path):
+    path = abspath(os.path.expanduser(path))
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return FileSystemBytecodeCache(path)
+
+
+def get_environment(options, templates):
+    dirnames, names = template_names(options, templates)
+    key = (tuple(dirnames), tuple(abspath(x) for x in options.dirnames), tuple(options.packages), options.builtin_templates,
+           options.symlinks, options.use_async, options.bytecode_cache)
+    with _environments_lock:
+        env = _environments.get(key, None)
+        if env is None:
+            env_options = {'enable_async': True} if options.use_async else {}
+            if options.bytecode_cache:
+                env_options['bytecode_cache'] = get_bytecode_cache(options.bytecode_cache)
+            env = _environments[key] = Environment(loader=get_loader(options, dirnames), extensions=DEFAULT_EXTENSIONS, **env_options)
+    return env, names
+
+
+def get_renders(options):
+    renders = [(options.template, options.outfile)]
+    for value in options.renders:
+        if '=' not in value:
+            parser.error('--template should be specified in the format template=outfile')
+        renders.append(tuple(value.split('=', 1)))
+    renders = [(tpl, None if outfile in (None, '', '-') else outfile) for tpl, outfile in renders]
+    if sum(1 for tpl, outfile in renders if outfile is None) > 1:
+        parser.error("only one template can be written to standard output")
+    for tpl, outfile in renders:
+        # Output is only written once rendering finishes, so a missing directory is reported before loading anything
+        if outfile is not None and not os.path.isdir(os.path.dirname(abspath(outfile))):
+            parser.error("can't write '%s': directory does not exist" % outfile)
+    return renders
+
+
+def connection_options(options):
+    try:
+        rules = [(pattern, int(seconds)) for pattern, seconds in options.cache_ttls.items()]
+    except ValueError:
+        parser.error('--cache-ttl should be specified in the format pattern=seconds')
+    return {
+        'cache': options.cache,
+        'cachetime': options.cachetime,
+        'cache_path': options.cache_path,
+        'cache_size': options.cache_size,
+        'cache_stale': options.cache_stale,
+        'cache_rules': rules,
+        'batch_size': options.batch_size,
+        'workers': options.workers,
+        'per_host': options.per_host,
+    }
+
+
+def make_plex(options, plexurl, **settings):
+    server_class, extra = PlexServer, dict(settings)
+    if options.from_snapshot:
+        if options.use_async:
+            parser.error("--from-snapshot can not be combined with --async")
+        if not os.path.exists(plexurl):
+            parser.error("snapshot '%s' does not exist" % plexurl)
+        server_class = SnapshotPlexServer
+    elif options.use_async:
+        from .plex import aio
+        server_class, extra['limit'] = aio.AsyncPlexServer, options.inflight
+    return server_class(plexurl, stream=options.stream, page_size=options.page_size, image_cache=options.image_cache,
+                        lean=options.lean, stats=bool(options.stats or options.stats_json), **dict(connection_options(options), **extra))
 
 
-def get_plex(options):
-    plex = PlexServer(options.plexurl, cache=options.cache, cachetime=options.cachetime)
+def get_plex(options, plexurl, preload=False, **settings):
+    if options.incremental:
+        if options.from_snapshot:
+            parser.error("--incremental can not be combined with --from-snapshot")
+        settings['detail_store'] = Snapshot(options.incremental, 'a')
+    plex = make_plex(options, plexurl, **settings)
     try:
         plex.load()
     except:
-        parser.error("Unable to access plex at %s" % options.plexurl)
+        parser.error("Unable to access plex at %s" % plexurl)
+    if (options.workers > 1 or preload) and not options.use_async:
+        plex.preload()
     return plex
 
 
-def export(argv=None):
-    options = parser.parse_args(argv) if argv else parser.parse_args()
-    loader, templatename = get_loader(options)
-    env = Environment(loader=loader, extensions=DEFAULT_EXTENSIONS)
-    template = env.get_template(templatename)
-    plex = get_plex(options)
-    data = options.options
+def load_servers(options, urls, preload=False, **settings):
+    servers = [None] * len(urls)
+
+    def load(index):
+        servers[index] = get_plex(options, urls[index], preload, **settings)
+    _run_pool(load, list(range(len(urls))), len(urls))
+    return servers
+
+
+def get_servers(options, **settings):
+    multiple = bool(options.servers or options.all_servers)
+    if multiple and options.incremental:
+        parser.error("--incremental can only be used with a single server")
+    if options.all_servers and options.from_snapshot:
+        parser.error("--all-servers can not be combined with --from-snapshot")
+    servers = load_servers(options, [options.plexurl] + options.servers, multiple, **settings)
+    if options.all_servers:
+        known, urls = set(plex.machineIdentifier for plex in servers), []
+        for item in servers[0].get('servers', None) or []:
+            if item.machineIdentifier not in known:
+                known.add(item.machineIdentifier)
+                urls.append(item.plex_url)
+        servers += load_servers(options, urls, multiple, **settings)
+    return servers
+
+
+def analyze(options, env, names):
+    if not options.analyze:
+        return {}
+    fields, sections = set(), set()
+    for name in names:
+        analysis = analyze_template(env, name, SHARD_VARIABLES if options.shard else ())
+        if options.verbose:
+            sys.stderr.write(analysis.describe() + '\n')
+        fields = None if fields is None or analysis.dynamic else fields | analysis.fields
+        sections = None if sections is None or analysis.sections is None else sections | analysis.sections
+    if options.shard:
+        if fields is not None:
+            fields |= set(x[1] for x in string.Formatter().parse(options.shard) if x[1])
+        if sections is not None:
+            sections.add(options.shard_section)
+    return {'fields': fields, 'sections': sections}
+
+
+def server_label(plex):
+    return "%s (%s)" % (plex.friendlyName, plex._url_parts[1] or plex._url_parts[2])
+
+
+def get_context(options, servers):
+    plex = servers[0]
+    data = dict(options.options)
     data.update({
         'plex': plex,
         'server': plex,
+        'servers': servers,
+        'merged': MergedCollection(servers),
         'library': plex.library,
         'current_server': plex.servers.from_machine_id(plex.machineIdentifier),
         'version': __version__,
         'now': datetime.now(),
     })
-    rendered = template.render(**data)
-    if options.outfile:
-        options.outfile.write(rendered)
-        options.outfile.close()
+    return data
+
+
+def snapshot(argv):
+    options = snapshot_parser.parse_args(argv)
+    plex = PlexServer(options.plexurl, **connection_options(options))
+    started = time.time()
+    try:
+        record(plex, options.snapshot)
+    except (exceptions.InvalidTokenException, exceptions.TokenRequiredException):
+        snapshot_parser.error("Unable to access plex at %s" % options.plexurl)
+    sys.stderr.write("Created snapshot using %d requests in %.2fs\n" % (plex.config.request_count, time.time() - started))
+
+
+def warm(argv):
+    options = warm_parser.parse_args(argv)
+    if options.cache != 'sqlite':
+        warm_parser.error("warming requires a persistent cache, use --cache sqlite")
+    plex = PlexServer(options.plexurl, **connection_options(options))
+    # Entries are stored for at least the window they are warmed for, also when a shorter ttl applies to them
+    plex.config.cache.min_fresh = plex.config.cache.min_ttl = options.ahead
+    started = time.time()
+    try:
+        sections = plex.library_sections()
+        prefetch([x for x in [plex.get('servers', None)] if x is not None])
+    except (exceptions.InvalidTokenException, exceptions.TokenRequiredException):
+        warm_parser.error("Unable to access plex at %s" % options.plexurl)
+    if options.sections:
+        sections = find_sections(sections, options.sections)
+    sys.stdout.write("Warming %d section(s) of %s\n" % (len(sections), plex.friendlyName))
+
+    def warm_section(section):
+        section_started = time.time()
+        listing = section.get('all', None)
+        count = crawl_listing(listing) if listing is not None else 0
+        sys.stdout.write("  %s: %d items in %.2fs\n" % (section.data.get('title'), count, time.time() - section_started))
+        sys.stdout.flush()
+    _run_pool(warm_section, sections, options.workers)
+    cache = plex.config.cache
+    sys.stdout.write("Done in %.2fs: %d requests, %d fresh, %d refreshed\n" % (time.time() - started, plex.config.request_count, cache.hits, cache.misses))
+
+
+COMMANDS = {
+    'snapshot': snapshot,
+    'warm': warm,
+}
+
+
+def check_options(options):
+    if options.shard and (options.outfile or options.renders or options.servers or options.all_servers or options.use_async):
+        parser.error("--shard renders one template for one server and can not be combined with OUTFILE, --template, --server, --all-servers or --async")
+    if options.watch and (options.from_snapshot or options.stream):
+        parser.error("--watch keeps the library in memory and can not be combined with --from-snapshot or --stream")
+
+
+def open_assets(options, outfiles, servers):
+    if not options.assets_dir:
+        return None
+    assets = AssetWriter.for_output(options.assets_dir, options.shard or outfiles[0], workers=max(options.workers, DEFAULT_ASSET_WORKERS)).open()
+    for plex in servers:
+        plex.config.assets = assets
+    return assets
+
+
+def render_outputs(options, env, templatenames, outfiles, servers):
+    if options.shard:
+        render_shards(options, servers[0])
     else:
-        print(rendered)
+        render(options, [(env.get_template(name), outfile) for name, outfile in zip(templatenames, outfiles)], servers)
+
+
+def watch(options, servers, callback):
+    try:
+        Watcher(servers, callback, options.interval, options.debounce).run(options.polls)
+    except KeyboardInterrupt:
+        pass
+
+
+def close_stores(servers):
+    for plex in servers:
+        if plex.config.detail_store is not None:
+            plex.config.detail_store.close()
+
+
+def export(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    options = parser.parse_args(argv)
+    check_options(options)
+    renders = get_renders(options)
+    env, templatenames = get_environment(options, [tpl for tpl, outfile in renders])
+    for name in templatenames:
+        env.get_template(name)
+    outfiles = [outfile for tpl, outfile in renders]
+    if options.assets_dir and len(set(os.path.dirname(abspath(x)) if x else None for x in outfiles)) > 1:
+        parser.error("--assets-dir requires every output to be written to the same directory")
+    started = time.time()
+    servers = get_servers(options, **analyze(options, env, templatenames))
+    assets = open_assets(options, outfiles, servers)
+    try:
+        render_outputs(options, env, templatenames, outfiles, servers)
+        for plex in servers:
+            if plex.config.detail_store is not None:
+                plex.config.detail_store.prune()
+        report(options, servers, started)
+        if options.watch:
+            watch(options, servers, lambda: render_outputs(options, env, templatenames, outfiles, servers))
+    finally:
+        if assets is not None:
+            assets.close()
+        close_stores(servers)
+
+
+def report(options, servers, started):
+    for plex in servers:
+        if len(servers) > 1 and (options.verbose or options.stats):
+            sys.stderr.write("%s:\n" % server_label(plex))
+        if options.verbose:
+            report_decisions(plex)
+        if plex.stats is not None and options.stats:
+            sys.stderr.write(plex.stats.format(plex.config.cache) + '\n')
+    if options.stats_json:
+        with open(options.stats_json, 'w') as fh:
+            if len(servers) == 1:
+                fh.write(servers[0].stats.to_json(servers[0].config.cache))
+            else:
+                json.dump(dict((server_label(x), x.stats.report(x.config.cache)) for x in servers), fh, indent=2, sort_keys=True)
+    if options.workers > 1 or options.use_async or len(servers) > 1:
+        elapsed = time.time() - started
+        count = sum(plex.config.request_count for plex in servers)
+        sys.stderr.write("%d requests in %.2fs (%.1f requests/s)\n" % (count, elapsed, count / elapsed if elapsed else 0))
+
+
+class ShardFields(dict):
+    def __missing__(self, key):
+        return ''
+
+
+def shard_path(pattern, item):
+    return string.Formatter().vformat(pattern, (), ShardFields(item._data))
+
+
+def shard_chunks(pattern, listing):
+    chunk = []
+    for item in listing:
+        chunk.append((shard_path(pattern, item), ET.tostring(item_element(item))))
+        if len(chunk) >= SHARD_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_shards(options, plex):
+    wanted = options.shard_section
+    sections = [x for x in plex.library_sections() if wanted in (x.data.get('title'), x.data.get('key'), x.data.get('type'))]
+    listing = sections[0].get('all', None) if sections else None
+    if listing is None:
+        parser.error("section '%s' does not exist" % wanted)
+    processes = options.processes or multiprocessing.cpu_count()
+    stats = plex.stats
+    started = time.time()
+    if processes <= 1:
+        _init_shard_worker(options, None, plex)
+        results = [_render_shard_chunk(chunk) for chunk in shard_chunks(options.shard, listing)]
+    else:
+        settings = {'fields': plex.config.fields, 'sections': plex.config.sections}
+        pool = multiprocessing.Pool(processes, _init_shard_worker, (options, settings))
+        try:
+            results = list(pool.imap_unordered(_render_shard_chunk, shard_chunks(options.shard, listing)))
+        finally:
+            pool.close()
+            pool.join()
+    if stats is not None:
+        stats.render_time += time.time() - started
+    count, changed = sum(x[0] for x in results), sum(x[1] for x in results)
+    sys.stderr.write("Rendered %d items to %s: %d changed, %d unchanged\n" % (count, options.shard, changed, count - changed))
+
+
+_shard_state = {}
+
+
+def _init_shard_worker(options, settings, plex=None):
+    env, names = get_environment(options, [options.template])
+    if plex is None:
+        # Worker processes connect on their own, the same way as the main process apart from preloading
+        plex = make_plex(options, options.plexurl, **settings)
+        if options.assets_dir:
+            plex.config.assets = AssetWriter.for_output(options.assets_dir, options.shard, workers=1).open()
+    _shard_state.update(options=options, template=env.get_template(names[0]), plex=plex)
+
+
+def _render_shard_chunk(chunk):
+    options, template, plex = _shard_state['options'], _shard_state['template'], _shard_state['plex']
+    changed = 0
+    for path, content in chunk:
+        data = dict(options.options)
+        data.update({
+            'plex': plex,
+            'server': plex,
+            'item': item_from_element(plex, ET.fromstring(content)),
+            'version': __version__,
+            'now': datetime.now(),
+        })
+        dname = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(dname):
+            try:
+                os.makedirs(dname)
+            except OSError:
+                if not os.path.isdir(dname):
+                    raise
+        with OutputWriter(path, flush_size=options.flush_size, only_changed=True) as writer:
+            writer.write_stream(template.generate(**data))
+        changed += int(bool(writer.changed))
+    return len(chunk), changed
+
+
+def report_decisions(plex):
+    for url, (keys, missing) in plex.config.detail_decisions.items():
+        path = parse.urlsplit(url)[2]
+        if missing:
+            sys.stderr.write("%s: loaded details of %d items for %s\n" % (path, len(keys), ', '.join(sorted(missing))))
+        else:
+            sys.stderr.write("%s: listing data suffices, skipped details of %d items\n" % (path, len(keys)))
+
+
+def render(options, jobs, servers):
+    stats = servers[0].stats
+    if stats is None:
+        return _render_jobs(options, jobs, servers)
+    with stats.timer('render_time'):
+        return _render_jobs(options, jobs, servers)
+
+
+def _render_jobs(options, jobs, servers):
+    if options.use_async:
+        # Templates share one event loop at a time, so they are rendered one after the other
+        for template, outfile in jobs:
+            _render(options, template, servers, outfile)
+        return
+    if options.prefetch_images:
+        images = []
+        for template, outfile in jobs:
+            images.extend(collect_images([x.config for x in servers], lambda: deque(template.generate(**get_context(options, servers)), maxlen=0)))
+        prefetch_images(images)
+    _run_pool(lambda job: _render(options, job[0], servers, job[1]), jobs, len(jobs))
+
+
+def _render(options, template, servers, outfile):
+    with OutputWriter(outfile, flush_size=options.flush_size, atomic=options.atomic, only_changed=bool(options.incremental or options.watch)) as writer:
+        if options.use_async:
+            from .plex import aio
+            aio.run(aio.render(template, servers, lambda: get_context(options, servers), writer, images=options.prefetch_images))
+        else:
+            writer.write_stream(template.generate(**get_context(options, servers)))
+    if writer.changed is False:
+        sys.stderr.write("%s is unchanged\n" % outfile)
@@ -0,0 +1,186 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import sys
+import hashlib
+import tempfile
+import threading
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+DEFAULT_FLUSH_SIZE = 64 * 1024
+DEFAULT_ASSET_WORKERS = 4
+
+__all__ = [
+    'OutputWriter',
+    'AssetWriter',
+]
+
+
+def _replace(src, dst):
+    getattr(os, 'replace', os.rename)(src, dst)
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(DEFAULT_FLUSH_SIZE), b''):
+                digest.update(chunk)
+    except (IOError, OSError):
+        return None
+    return digest.hexdigest()
+
+
+class OutputWriter(object):
+    def __init__(self, path=None, flush_size=DEFAULT_FLUSH_SIZE, atomic=False, encoding='utf-8', only_changed=False):
+        self.path = path
+        self.flush_size = flush_size
+        self.only_changed = only_changed and path is not None
+        self.atomic = (atomic or self.only_changed) and path is not None
+        self.encoding = encoding
+        self.changed = None
+        self._hash = hashlib.sha1()
+        self._buffer = []
+        self._buffered = 0
+        self._fh = None
+        self._tmp = None
+
+    def open(self):
+        if self.path is None:
+            self._fh = sys.stdout
+        elif self.atomic:
+            dname, fname = os.path.split(os.path.abspath(self.path))
+            fd, self._tmp = tempfile.mkstemp(dir=dname, prefix='.%s.' % fname, suffix='.tmp')
+            self._fh = io.open(fd, 'w', encoding=self.encoding)
+        else:
+            self._fh = io.open(self.path, 'w', encoding=self.encoding)
+        return self
+
+    def write(self, chunk):
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= self.flush_size:
+            self.flush()
+
+    def write_stream(self, stream):
+        for chunk in stream:
+            self.write(chunk)
+
+    def flush(self):
+        if self._buffer:
+            data = ''.join(self._buffer)
+            self._fh.write(data)
+            self._hash.update(data.encode(self.encoding))
+            self._buffer = []
+            self._buffered = 0
+        self._fh.flush()
+
+    def close(self, failed=False):
+        if self._fh is None:
+            return
+        if self.path is None:
+            if not failed:
+                self.write('\n')
+                self.flush()
+            self._fh = None
+            return
+        if not failed:
+            self.flush()
+        self._fh.close()
+        self._fh = None
+        if self._tmp is None:
+            return
+        if not failed and self.only_changed and _file_hash(self.path) == self._hash.hexdigest():
+            self.changed = False
+            os.unlink(self._tmp)
+        elif failed:
+            os.unlink(self._tmp)
+        else:
+            self.changed = True
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(self._tmp, 0o666 & ~umask)
+            _replace(self._tmp, self.path)
+        self._tmp = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(failed=exc_type is not None)
+
+
+class AssetWriter(object):
+    def __init__(self, path, url_prefix='', workers=DEFAULT_ASSET_WORKERS):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.url_prefix = url_prefix.rstrip('/')
+        self.workers = workers
+        self._names = set()
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pending = []
+
+    @classmethod
+    def for_output(cls, path, outfile=None, **kwargs):
+        base = os.path.dirname(os.path.abspath(outfile)) if outfile else os.getcwd()
+        prefix = os.path.relpath(os.path.abspath(path), base).replace(os.sep, '/')
+        return cls(path, prefix, **kwargs)
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.path)
+
+    def url(self, name):
+        if self.url_prefix in ('', '.'):
+            return name
+        return '%s/%s' % (self.url_prefix, name)
+
+    def store(self, data, extension=None):
+        name = '%s.%s' % (hashlib.sha1(data).hexdigest(), extension or 'bin')
+        with self._lock:
+            if name in self._names:
+                return self.url(name)
+            self._names.add(name)
+        filename = os.path.join(self.path, name)
+        if not os.path.exists(filename):
+            self._submit(filename, data)
+        return self.url(name)
+
+    def _submit(self, filename, data):
+        if ThreadPoolExecutor is None or self.workers <= 1:
+            self._write(filename, data)
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            self._pending.append(self._pool.submit(self._write, filename, data))
+
+    def _write(self, filename, data):
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        _replace(tmp, filename)
+
+    def open(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        return self
+
+    def close(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
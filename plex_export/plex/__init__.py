@@ -1,3 +1,4 @@
 from __future__ import unicode_literals, absolute_import
 from .base import PlexServer  # noqa
+from .merged import MergedCollection  # noqa
 from .datatypes import *  # noqa
@@ -0,0 +1,69 @@
+from __future__ import unicode_literals, absolute_import
+
+import asyncio
+
+
+async def aprefetch(objects):
+    pending = [obj for obj in objects if hasattr(obj, 'afetch') and not obj._loaded and obj._xml is None]
+    await asyncio.gather(*[obj.afetch() for obj in pending])
+    return len(pending)
+
+
+async def ahydrate_batches(batches):
+    await aprefetch(batches)
+    for batch in batches:
+        batch.load()
+
+
+class AsyncRequestMixin(object):
+    async def afetch(self):
+        if self._xml is None:
+            resp = await self.config.aget(self.url, headers=self.request_headers())
+            self._xml = self.parse_response(resp)
+            self.config.record(self.url, resp)
+        return self._xml
+
+    async def aload(self):
+        if not self._loaded:
+            await self.afetch()
+            self.load()
+        return self
+
+
+class AsyncDirectoryMixin(object):
+    async def aload(self):
+        if self._loaded:
+            return self
+        await self.aassemble()
+        if self._loaded:
+            return self
+        root = self.process_root(await self.afetch())
+        pages = self.remaining_pages(root)
+        await aprefetch(pages)
+        self.load_from(root)
+        self.load_pages(pages)
+        return self
+
+    async def aassemble(self):
+        bulks = self.bulk_listings()
+        await asyncio.gather(*[bulk.aload() for bulk in bulks])
+        self.assemble(bulks)
+
+    async def ahydrate(self, batch_size=None):
+        await self.aload()
+        await ahydrate_batches(self.hydration_batches(batch_size))
+        return self
+
+    async def _aiter(self):
+        await self.aload()
+        listing, items = self.detail_group()
+        if items and listing.detail_needed(items):
+            if self.config.batch_size:
+                await ahydrate_batches(self.hydration_batches(items=items))
+            else:
+                await aprefetch(self.hydration_items(items))
+        for item in self._items:
+            yield item
+
+    def __aiter__(self):
+        return self._aiter()
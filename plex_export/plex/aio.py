@@ -0,0 +1,128 @@
+from __future__ import unicode_literals, absolute_import
+
+import time
+import asyncio
+
+from .base import RequestConfig, PlexServer, prefetch_images, find_sections
+from ._async import aprefetch
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DEFAULT_LIMIT = 100
+
+__all__ = [
+    'AsyncRequestConfig',
+    'AsyncPlexServer',
+    'aprefetch',
+    'render',
+    'run',
+]
+
+
+class AsyncResponse(object):
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class AsyncRequestConfig(RequestConfig):
+    def __init__(self, session=None, limit=DEFAULT_LIMIT, **options):
+        super(AsyncRequestConfig, self).__init__(session=session, **options)
+        self.limit = limit
+        self._asession = None
+        self._semaphore = None
+
+    def _async_session(self):
+        if aiohttp is None:
+            raise ImportError("The asyncio backend requires aiohttp to be installed")
+        if self._asession is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.per_host or 0)
+            self._asession = aiohttp.ClientSession(connector=connector, headers=dict(self._session.headers))
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._asession
+
+    async def aget(self, url, headers=None):
+        cached = self.cache.fresh(url, headers) if self.cache is not None and not self.bypass_cache else None
+        if cached is not None:
+            return cached
+        session = self._async_session()
+        with self._lock:
+            self.request_count += 1
+        started = time.time()
+        async with self._semaphore:
+            async with session.get(url, headers=headers) as resp:
+                response = AsyncResponse(resp.status, await resp.read(), resp.headers)
+        if self.stats is not None:
+            self.stats.record_request(url, len(response.content), time.time() - started)
+        if self.cache is not None:
+            self.cache.put(url, headers, response)
+        return response
+
+    async def aclose(self):
+        if self._asession is not None:
+            await self._asession.close()
+            self._asession = None
+
+
+class AsyncPlexServer(PlexServer):
+    config_class = AsyncRequestConfig
+
+    async def apreload(self):
+        await self.aload()
+        servers = self.get('servers', None)
+        if servers is not None:
+            await servers.aload()
+        library = self.get('library', None)
+        if library is None:
+            return
+        await library.aload()
+        sections = library.get('sections', None)
+        if sections is None:
+            return
+        await sections.aload()
+        await aprefetch(sections.items)
+        listings = [section.get('all', None) for section in find_sections(sections.items, self.config.sections or ())]
+        await aprefetch([x for x in listings if x is not None])
+
+    async def aclose(self):
+        await self.config.aclose()
+
+
+async def collect_images(configs, template, context):
+    collected = []
+    for config in configs:
+        config.collected_images = collected
+    try:
+        async for _ in template.generate_async(**context()):
+            pass
+    except Exception:
+        pass
+    finally:
+        for config in configs:
+            config.collected_images = None
+    return collected
+
+
+async def render(template, servers, context, writer, images=False):
+    try:
+        await asyncio.gather(*[plex.apreload() for plex in servers])
+        if images:
+            collected = await collect_images([plex.config for plex in servers], template, context)
+            await asyncio.get_event_loop().run_in_executor(None, prefetch_images, collected)
+        async for chunk in template.generate_async(**context()):
+            writer.write(chunk)
+    finally:
+        for plex in servers:
+            await plex.aclose()
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
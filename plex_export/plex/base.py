@@ -1,11 +1,20 @@
 from __future__ import unicode_literals, absolute_import
 
+import io
+import sys
+import time
 import requests
+import itertools
 import six
+import threading
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
 from six.moves.urllib import parse
 
 from .. import exceptions
-from .util import _join_plex, image_getter
+from .util import _join_plex, _intern, image_getter, ImageCache
+from .cache import ResponseCache
+from .stats import Stats
 
 try:
     from lxml import etree as ET
@@ -16,10 +25,25 @@ try:
 except ImportError:
     __version__ = '0.0.0'
 try:
-    from requests_cache import CachedSession
-except:
-    CachedSession = None
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+if sys.version_info >= (3, 6):
+    from ._async import AsyncRequestMixin, AsyncDirectoryMixin
+else:
+    class AsyncRequestMixin(object):
+        pass
+
+    class AsyncDirectoryMixin(object):
+        pass
 NO_DEFAULT = object()
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_IMAGE_WORKERS = 8
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+_lock_guard = threading.Lock()
+STREAM_CHUNK_SIZE = 64 * 1024
+# Plex only includes the first few of these tags in section listings
+TRUNCATED_TAGS = frozenset(['Genre', 'Director', 'Writer', 'Producer', 'Country', 'Role', 'Collection', 'Label'])
 
 DEFAULT_HEADERS = {
     'X-Plex-Device-Name': 'plex-export (%s)' % __version__
@@ -27,15 +51,109 @@ DEFAULT_HEADERS = {
 
 
 class RequestConfig(object):
-    def __init__(self, session=None):
+    def __init__(self, session=None, batch_size=None, workers=1, per_host=None, stream=False, page_size=None,
+                 image_cache=None, detail_store=None, cache=None, stats=None, lean=False, fields=None, sections=None):
         self._session = session or requests.Session()
         self._session.headers.update(DEFAULT_HEADERS)
+        self.cache = cache
+        self.stats = Stats() if stats is True else stats or None
+        if isinstance(image_cache, six.string_types):
+            image_cache = ImageCache(image_cache)
+        self.image_cache = image_cache
+        self.collected_images = None
+        self.assets = None
+        self.recorder = None
+        self.detail_store = detail_store
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.stream = stream
+        self.lean = lean
+        self.fields = fields
+        # Titles, keys or types of the sections whose listings preload fetches ahead of rendering
+        self.sections = sections
+        self.detail_decisions = OrderedDict()
+        self.workers = workers or 1
+        self.per_host = per_host
+        self.request_count = 0
+        # Fetch from the server even when the cache has a fresh response, still storing what was fetched
+        self.bypass_cache = False
+        self._lock = threading.Lock()
+        self._host_limits = {}
+        pool_size = max(10, self.workers, per_host or 0)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def host_limit(self, url):
+        if not self.per_host:
+            return None
+        netloc = parse.urlsplit(url)[1]
+        with self._lock:
+            if netloc not in self._host_limits:
+                self._host_limits[netloc] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[netloc]
+
+    def get(self, url, *args, **kwargs):
+        if self.cache is not None:
+            kwargs.pop('stream', None)
+            if self.bypass_cache:
+                return self.cache.refresh(self._get, url, kwargs.pop('headers', None))
+            return self.cache.get(self._get, url, kwargs.pop('headers', None))
+        return self._get(url, *args, **kwargs)
+
+    def _get(self, url, *args, **kwargs):
+        with self._lock:
+            self.request_count += 1
+        started = time.time()
+        limit = self.host_limit(url)
+        if limit is None:
+            resp = self._session.get(url, *args, **kwargs)
+        else:
+            with limit:
+                resp = self._session.get(url, *args, **kwargs)
+        if self.stats is not None:
+            size = int(resp.headers.get('Content-Length', 0) or 0) if kwargs.get('stream') else len(resp.content)
+            self.stats.record_request(url, size, time.time() - started)
+        return resp
+
+    def record_decision(self, url, items, missing):
+        # Items are counted by their ratingKey, so iterating a listing again does not count them twice
+        keys = set(item._data['ratingKey'] for item in items if isinstance(item, SelfLoading) and item.needs_hydration)
+        if not keys:
+            return
+        with self._lock:
+            previous, fields = self.detail_decisions.get(url, (set(), set()))
+            self.detail_decisions[url] = (previous | keys, fields | missing)
 
-    def get(self, *args, **kwargs):
-        return self._session.get(*args, **kwargs)
-
-
-class RequestBase(object):
+    def record(self, url, resp):
+        if resp.status_code != 200:
+            return
+        if self.recorder is not None:
+            self.recorder.store(url, resp.content)
+        if self.detail_store is not None:
+            self.detail_store.store_details(url, resp.content)
+
+    def get_image(self, url, version=None):
+        started = time.time()
+        key = None
+        if self.image_cache is not None:
+            key = self.image_cache.key(url, version)
+            data = self.image_cache.get(key)
+            if data is not None:
+                if self.stats is not None:
+                    self.stats.record_image(len(data), time.time() - started, cached=True)
+                return data
+        resp = self.get(url)
+        if resp.status_code != 200:
+            return None
+        if key is not None:
+            self.image_cache.set(key, resp.content)
+        if self.stats is not None:
+            self.stats.record_image(len(resp.content), time.time() - started)
+        return resp.content
+
+
+class RequestBase(AsyncRequestMixin):
     def __init__(self, base, relative=None):
         self._has_token = False
         self._url = None
@@ -45,6 +163,7 @@ class RequestBase(object):
         self._url_parts = None
         self._headers = None
         self._config = None
+        self._load_lock = None
         if isinstance(base, six.string_types):
             base_url = base
             self._url_parts = list(parse.urlsplit(base_url))
@@ -86,26 +205,54 @@ class RequestBase(object):
     def has_token(self):
         return self._has_token
 
+    @property
+    def load_lock(self):
+        # Serializes fetching and building this object when several templates render from it concurrently
+        if self._load_lock is None:
+            with _lock_guard:
+                if self._load_lock is None:
+                    self._load_lock = threading.RLock()
+        return self._load_lock
+
     @property
     def config(self):
         if not self._config:
             self._config = RequestConfig()
         return self._config
 
-    def _request(self):
-        return self.config.get(self.url)
+    def request_headers(self):
+        return None
 
-    @property
-    def xml(self):
-        if self._xml is not None:
-            return self._xml
-        resp = self._request()
+    def _request(self, **kwargs):
+        return self.config.get(self.url, headers=self.request_headers(), **kwargs)
+
+    def _check_response(self, resp):
         if resp.status_code == 401:
             if not self.has_token:
                 raise exceptions.TokenRequiredException()
             raise exceptions.InvalidTokenException()
-        self._xml = ET.fromstring(resp.content)
-        return self.xml
+        return resp
+
+    def parse_response(self, resp):
+        content = self._check_response(resp).content
+        stats = self.config.stats
+        if stats is None:
+            return ET.fromstring(content)
+        with stats.timer('parse_time'):
+            return ET.fromstring(content)
+
+    def fetch(self):
+        if self._xml is None:
+            with self.load_lock:
+                if self._xml is None:
+                    resp = self._request()
+                    self._xml = self.parse_response(resp)
+                    self.config.record(self.url, resp)
+        return self._xml
+
+    @property
+    def xml(self):
+        return self.fetch()
 
     def process_root(self, element):
         raise NotImplementedError()
@@ -116,50 +263,222 @@ class RequestBase(object):
     def load(self):
         if self._loaded:
             return
-        root = self.process_root(self.xml)
-        for element in root.getchildren():
-            self.process_element(element)
+        with self.load_lock:
+            if self._loaded:
+                return
+            if self.config.stats is not None:
+                self.config.stats.record_lazy_load(self)
+            self.load_from(self.process_root(self.xml))
+
+    def load_from(self, root):
+        elements = list(root)
+        stats = self.config.stats
+        if stats is None:
+            for element in elements:
+                self.process_element(element)
+        else:
+            with stats.timer('build_time', len(elements)):
+                for element in elements:
+                    self.process_element(element)
+        self._loaded = True
+        if self.config.lean:
+            self._xml = None
 
 
-class BaseDirectory(RequestBase):
+class BaseDirectory(AsyncDirectoryMixin, RequestBase):
     _viewgroups = {}
     _keygroups = {}
+    _typegroups = {}
     _default_viewgroup = None
+    _paginated = True
+    _crawl_children = False
 
     def __init__(self, base, relative=None):
         self._items = []
         self._itemsdict = {}
+        self._itemsindex = {}
+        self._indices = None
+        self._images = None
+        self._element = None
+        self._tag = None
         self._child = self._default_viewgroup
         self._data = {}
         super(BaseDirectory, self).__init__(base, relative=relative)
 
     @property
     def indices(self):
-        keys = ['key', 'type', 'title']
-        bad_tokens = lambda x: '/' in x or '?' in x
-        return [x for x in [self._data.get(key, None) for key in keys] if x and not bad_tokens(x)]
+        if self._indices is None:
+            keys = ['key', 'type', 'title']
+            bad_tokens = lambda x: '/' in x or '?' in x
+            self._indices = [x for x in [self._data.get(key, None) for key in keys] if x and not bad_tokens(x)]
+        return self._indices
 
     def process_root(self, element):
         viewgroup = element.attrib.get('viewGroup', None)
         if viewgroup in self._viewgroups:
             self._child = self._viewgroups[viewgroup]
         self._data.update(element.attrib)
+        self._indices = None
         return element
 
-    def process_element(self, element):
+    def make_child(self, element):
         child = self._child
         if element.tag in self._viewgroups:
             child = self._viewgroups[element.tag]
+        kind = element.attrib.get('type', None)
+        if kind in self._typegroups:
+            child = self._typegroups[kind]
         key = element.attrib.get('key', None)
         if key:
             url_key = _join_plex(self._url_parts[2], key)
             url_key = url_key.lstrip('/')
             if url_key in self._keygroups:
                 child = self._keygroups[url_key]
-        item = child(self, key, element)
+        return child(self, key, element)
+
+    def process_element(self, element):
+        self.add_item(self.make_child(element))
+
+    def refresh(self, stale=()):
+        with self.load_lock:
+            previous = dict((item_version(x), x) for x in self._items if x._data.get('ratingKey', None) and x._data['ratingKey'] not in stale)
+            self._xml = None
+            self._loaded = False
+            self._items, self._itemsdict, self._itemsindex, self._indices = [], {}, {}, None
+            self.load()
+            fetched = self._items
+            items = [previous.get(item_version(x), x) for x in fetched]
+            self._items, self._itemsdict, self._itemsindex = [], {}, {}
+            for item in items:
+                self.add_item(item)
+        return [x for x, y in zip(items, fetched) if x is y]
+
+    def add_item(self, item):
         self._items.append(item)
         for index in item.indices:
             self._itemsdict[index] = item
+            self._itemsindex.setdefault(index, []).append(item)
+
+    @property
+    def page_size(self):
+        return self.config.page_size if self._paginated else None
+
+    def request_headers(self):
+        if self.page_size:
+            return page_headers(0, self.page_size)
+        return None
+
+    def page(self, start):
+        return ContainerPage(self, start, self.page_size)
+
+    def remaining_pages(self, root):
+        total = int(root.attrib.get('totalSize', 0) or 0)
+        if not self.page_size or len(root) >= total:
+            return []
+        return [self.page(start) for start in range(self.page_size, total, self.page_size)]
+
+    def load_pages(self, pages):
+        for page in pages:
+            self.load_from(page.xml)
+            page._xml = None
+
+    def bulk_listings(self):
+        return []
+
+    def assemble(self, bulks=None):
+        pass
+
+    def load(self):
+        if self._loaded:
+            return
+        with self.load_lock:
+            bulks = self.bulk_listings()
+            prefetch(bulks)
+            self.assemble(bulks)
+            if self._loaded:
+                return
+            if self.config.stats is not None:
+                self.config.stats.record_lazy_load(self)
+            root = self.process_root(self.xml)
+            pages = self.remaining_pages(root)
+            self.load_from(root)
+            window = max(1, self.config.workers) * 2
+            for offset in range(0, len(pages), window):
+                chunk = pages[offset:offset + window]
+                prefetch(chunk)
+                self.load_pages(chunk)
+
+    def stream(self, chunk_size=STREAM_CHUNK_SIZE):
+        if self._loaded:
+            for item in self._items:
+                yield item
+            return
+        start, page_size = 0, self.page_size
+        while True:
+            children = iter_children(self.page(start) if start else self, chunk_size)
+            root = next(children, None)
+            if root is None:
+                return
+            if not start:
+                self.process_root(root)
+            count = 0
+            for element in children:
+                count += 1
+                yield self.make_child(element)
+            start += count
+            if not page_size or not count or start >= int(root.attrib.get('totalSize', 0) or 0):
+                return
+
+    def _iter_stream(self):
+        items = self.stream()
+        first = next(items, None)
+        if first is None:
+            return
+        items = itertools.chain([first], items)
+        if getattr(type(first), '_bulk_paths', ()):
+            # Shows and artists are assembled from bulk listings of their section, which needs the complete listing
+            for item in items:
+                self.add_item(item)
+            self._loaded = True
+            for item in self.prepare_items(self._items):
+                yield item
+            return
+        batch_size = self.config.batch_size
+        if not batch_size and self.config.fields is None:
+            for item in items:
+                yield item
+            return
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= (batch_size or DEFAULT_BATCH_SIZE) * self.config.workers:
+                for prepared in self.prepare_items(chunk):
+                    yield prepared
+                chunk = []
+        for prepared in self.prepare_items(chunk):
+            yield prepared
+
+    def detail_needed(self, items):
+        fields = self.config.fields
+        if fields is None:
+            return True
+        if not items:
+            return False
+        missing = missing_fields(items, fields)
+        self.config.record_decision(self.url, items, missing)
+        if not missing:
+            use_listing(items)
+        return bool(missing)
+
+    def detail_group(self):
+        # The listing that decides whether details are needed, and the items whose details are loaded together
+        return self, self._items
+
+    def prepare_items(self, items):
+        with self.load_lock:
+            if self.detail_needed(items) and self.config.batch_size:
+                hydrate_items(items, self.config.batch_size)
+        return items
 
     def get(self, key, default=NO_DEFAULT):
         self.load()
@@ -168,7 +487,10 @@ class BaseDirectory(RequestBase):
         if default is NO_DEFAULT:
             return self._data[key]
         return self._data.get(key, default)
-    __getattr__ = __getitem__ = get
+    __getitem__ = get
+
+    def __getattr__(self, key):
+        return _get_attribute(self, key)
 
     def __dir__(self):
         base = list(super(BaseDirectory, self).__dir__())
@@ -180,7 +502,19 @@ class BaseDirectory(RequestBase):
         return len(self.items)
 
     def __iter__(self):
-        return iter(self.items)
+        if self.config.stream and not self._loaded and self._xml is None:
+            return self._iter_stream()
+        return iter(self.prepare_items(self.items))
+
+    def hydrate(self, batch_size=None):
+        hydrate_items(self.items, batch_size or self.config.batch_size or DEFAULT_BATCH_SIZE)
+        return self
+
+    def hydration_items(self, items=None):
+        return pending_details(self.items if items is None else items)
+
+    def hydration_batches(self, batch_size=None, items=None):
+        return metadata_batches(self.items if items is None else items, batch_size or self.config.batch_size or DEFAULT_BATCH_SIZE)
 
     @property
     def first(self):
@@ -198,20 +532,20 @@ class BaseDirectory(RequestBase):
 
     @property
     def element(self):
+        if self._element is None and self._tag is not None:
+            return ET.Element(self._tag, dict(self._data))
         return self._element
 
 
 class PlexServer(BaseDirectory):
-    def __init__(self, url, cache=False, cachetime=300):
+    config_class = RequestConfig
+
+    def __init__(self, url, cache=False, cachetime=None, cache_path=None, cache_size=None, cache_stale=0, cache_rules=None, **options):
         super(PlexServer, self).__init__(url)
-        session = None  # use the default session
-        cachetime = cachetime or None
-        if CachedSession and cache and isinstance(cache, six.string_types):
-            if cache == 'memory':
-                session = CachedSession(cache, cache, cachetime)
-            elif cache == 'sqlite':
-                session = CachedSession('request-cache', 'sqlite', cachetime, fast_save=True)
-        self._config = RequestConfig(session=session)
+        if cache and isinstance(cache, six.string_types):
+            cache = ResponseCache.create(cache, ttl=cachetime, path=cache_path, memory_size=cache_size or DEFAULT_CACHE_SIZE,
+                                         stale=cache_stale, rules=cache_rules)
+        self._config = self.config_class(cache=cache or None, **options)
 
     @property
     def headers(self):
@@ -230,6 +564,38 @@ class PlexServer(BaseDirectory):
         else:
             self._headers[header] = value
 
+    @property
+    def stats(self):
+        return self.config.stats
+
+    def library_sections(self, workers=None):
+        prefetch([self], workers)
+        library = self.get('library', None)
+        if library is None:
+            return []
+        prefetch([library], workers)
+        sections = library.get('sections', None)
+        if sections is None:
+            return []
+        prefetch([sections], workers)
+        return sections.items
+
+    def preload(self, workers=None):
+        sections = self.library_sections(workers)
+        prefetch([x for x in [self.get('servers', None)] + sections if x is not None], workers)
+        if self.config.stream:
+            # Streamed listings are parsed while they download, fetching them whole here would download them twice
+            return sections
+        listings = [section.get('all', None) for section in find_sections(sections, self.config.sections or ())]
+        prefetch([x for x in listings if x is not None], workers)
+        return sections
+
+    def crawl(self, workers=None):
+        listings = [x for x in [section.get('all', None) for section in self.preload(workers)] if x is not None]
+        prefetch(listings, workers)
+        for listing in listings:
+            crawl_listing(listing)
+
     def __repr__(self):
         scheme, netloc, path, qs, fragment = self._url_parts
         return "<%s: %s (%s)>" % (self.__class__.__name__, self.friendlyName, netloc)
@@ -238,9 +604,11 @@ class PlexServer(BaseDirectory):
 class Directory(BaseDirectory):
     def __init__(self, base, relative=None, element=None):
         super(Directory, self).__init__(base, relative=relative)
-        self._element = element
+        self._tag = element.tag
+        if not self.config.lean:
+            self._element = element
         self._data.update(element.attrib)
-        for child in element.getchildren():
+        for child in list(element):
             self.process_sub_element(child)
 
     art = image_getter('art')
@@ -263,41 +631,265 @@ BaseDirectory._default_viewgroup = Directory
 
 
 class MultiValue(object):
+    __slots__ = ()
+
     def get(self, key, default=NO_DEFAULT):
-        self.load()
+        if key not in self._data:
+            self.load()
         if key in self._data:
             return self._data[key]
-        ret = []
-        for item in self._items:
-            if key in item.indices:
-                ret.append(item)
-        default = None if NO_DEFAULT else NO_DEFAULT
-        return ret or default
-    __getattr__ = __getitem__ = get
+        items = self._itemsindex.get(key, None)
+        return list(items) if items else None
+    __getitem__ = get
+
+    def __getattr__(self, key):
+        return _get_attribute(self, key)
 
 
 class SelfLoading(object):
+    _paginated = False
+
     def process_root(self, element):
-        subtags = element.getchildren()
+        subtags = list(element)
         if subtags:
-            self._items = []
-            self._itemsdict = {}
-            element = subtags[0]
+            return self.process_detail(subtags[0])
+        return BaseDirectory.process_root(self, element)
+
+    def process_detail(self, element):
+        self._items = []
+        self._itemsdict = {}
+        self._itemsindex = {}
         return BaseDirectory.process_root(self, element)
 
+    def fetch_stored(self):
+        store = self.config.detail_store
+        if self._xml is not None or store is None:
+            return False
+        content = store.detail(self._data.get('ratingKey', None), self._data.get('updatedAt', None) or self._data.get('addedAt', None))
+        if content is None:
+            return False
+        self._xml = ET.fromstring(content)
+        return True
+
+    def fetch(self):
+        self.fetch_stored()
+        return super(SelfLoading, self).fetch()
+
+    @property
+    def needs_hydration(self):
+        return not self._loaded and self._xml is None and bool(self._data.get('ratingKey'))
+
+
+class MetadataBatch(RequestBase):
+    def __init__(self, base, items):
+        self._batch = OrderedDict((item._data['ratingKey'], item) for item in items)
+        super(MetadataBatch, self).__init__(base, '/library/metadata/%s' % ','.join(self._batch.keys()))
+
+    def __repr__(self):
+        return "<%s: %d items>" % (self.__class__.__name__, len(self._batch))
+
+    def load(self):
+        if self._loaded:
+            return
+        with self.load_lock:
+            if self._loaded:
+                return
+            for element in list(self.xml):
+                item = self._batch.get(element.attrib.get('ratingKey', None), None)
+                if item is None:
+                    continue
+                with item.load_lock:
+                    if not item._loaded:
+                        item.load_from(item.process_detail(element))
+            self._xml = None
+            self._loaded = True
+
+
+class ContainerPage(RequestBase):
+    def __init__(self, base, start, size):
+        super(ContainerPage, self).__init__(base)
+        self.start = start
+        self.size = size
+
+    def __repr__(self):
+        return "<%s: %s [%d:%d]>" % (self.__class__.__name__, self._url_parts[2], self.start, self.start + self.size)
+
+    def request_headers(self):
+        return page_headers(self.start, self.size)
+
+
+def page_headers(start, size):
+    return {
+        'X-Plex-Container-Start': str(start),
+        'X-Plex-Container-Size': str(size),
+    }
+
+
+def pending_details(items):
+    return [item for item in items if isinstance(item, SelfLoading) and item.needs_hydration and not item.fetch_stored()]
+
+
+def metadata_batches(items, batch_size=DEFAULT_BATCH_SIZE):
+    pending = pending_details(items)
+    return [MetadataBatch(pending[0], pending[offset:offset + batch_size]) for offset in range(0, len(pending), batch_size)]
+
+
+def item_version(item):
+    return item._data.get('ratingKey', None), item._data.get('updatedAt', None)
+
+
+def item_element(item):
+    element = ET.Element(item._tag or item.element.tag, dict(item._data))
+    element.extend([child.element if isinstance(child, DataNode) else item_element(child) for child in item._items])
+    return element
+
+
+def item_from_element(base, element):
+    item = base.make_child(element)
+    if isinstance(item, SelfLoading):
+        item._loaded = True
+    return item
+
+
+def find_sections(sections, names):
+    names = set(names)
+    return [x for x in sections if names & set([x._data.get('title'), x._data.get('key'), x._data.get('type')])]
+
+
+def use_listing(items):
+    for item in items:
+        if isinstance(item, SelfLoading) and item.needs_hydration:
+            item._loaded = True
+
+
+def missing_fields(items, fields):
+    missing = set(fields) - TRUNCATED_TAGS
+    pending = list(items)
+    while pending and missing:
+        node = pending.pop()
+        missing.difference_update(node._data)
+        missing.difference_update(node._itemsindex or ())
+        pending.extend(node._items)
+    return missing | (TRUNCATED_TAGS & set(fields))
+
+
+def hydrate_items(items, batch_size=DEFAULT_BATCH_SIZE):
+    batches = metadata_batches(items, batch_size)
+    if not batches:
+        return
+    # Keep at most a couple of responses per worker in memory at once
+    window = max(1, batches[0].config.workers) * 2
+    for offset in range(0, len(batches), window):
+        chunk = batches[offset:offset + window]
+        prefetch(chunk)
+        for batch in chunk:
+            batch.load()
+
+
+def crawl_items(items, batch_size=DEFAULT_BATCH_SIZE):
+    # Loads items with their details and every level below them, such as seasons and episodes
+    level = list(items)
+    while level:
+        hydrate_items(level, batch_size)
+        level = [item for node in level if isinstance(node, BaseDirectory) and node._crawl_children for item in node.items]
+
+
+def crawl_listing(listing):
+    crawl_items(listing.items, listing.config.batch_size or DEFAULT_BATCH_SIZE)
+    return len(listing.items)
+
+
+def _get_attribute(node, key):
+    # Keep python and jinja probing for special methods from loading data
+    if key.startswith('__'):
+        raise AttributeError(key)
+    return node.get(key)
+
+
+def _run_pool(func, items, workers):
+    workers = min(workers, len(items))
+    if workers <= 1 or ThreadPoolExecutor is None:
+        for item in items:
+            func(item)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(func, items):
+            pass
+
+
+def prefetch(objects, workers=None):
+    pending = [obj for obj in objects if isinstance(obj, RequestBase) and not obj._loaded and obj._xml is None]
+    if pending:
+        _run_pool(lambda obj: obj.fetch(), pending, workers or pending[0].config.workers)
+    return len(pending)
+
+
+def prefetch_images(images, workers=None):
+    groups = OrderedDict()
+    for image in images:
+        if image._data is None:
+            groups.setdefault(image.url, []).append(image)
+    if not groups:
+        return 0
+    first = [group[0] for group in groups.values()]
+    if not workers:
+        workers = first[0]._config.workers
+        workers = workers if workers > 1 else DEFAULT_IMAGE_WORKERS
+    _run_pool(lambda image: image.load(), first, workers)
+    for group in groups.values():
+        for image in group[1:]:
+            image.set_data(group[0]._data)
+    return len(first)
+
+
+def collect_images(configs, render):
+    collected = []
+    for config in configs:
+        config.collected_images = collected
+    try:
+        render()
+    except Exception:
+        # Images render as missing during this pass, any real error resurfaces in the actual render
+        pass
+    finally:
+        for config in configs:
+            config.collected_images = None
+    return collected
+
+
+class NodeSchema(object):
+    __slots__ = ('tag', 'keys', 'index')
+    _schemas = {}
+
+    def __init__(self, tag, keys):
+        self.tag = tag
+        self.keys = keys
+        self.index = dict((key, offset) for offset, key in enumerate(keys))
+
+    @classmethod
+    def for_element(cls, element):
+        key = (element.tag, tuple(element.attrib.keys()))
+        schema = cls._schemas.get(key, None)
+        if schema is None:
+            schema = cls._schemas.setdefault(key, cls(_intern(key[0]), tuple(_intern(x) for x in key[1])))
+        return schema
+
 
 @six.python_2_unicode_compatible
 class DataNode(MultiValue):
+    __slots__ = ('_schema', '_values', '_items', '_itemsindex', '_url_parts', '_config', '_images')
     _viewgroups = {}
     _default_viewgroup = None
 
     def __init__(self, base, relative=None, element=None):
-        self._element = element
-        self._items = []
-        self._data = {}
-        self._data.update(element.attrib)
+        self._schema = NodeSchema.for_element(element)
+        self._values = tuple(_intern(x) for x in element.attrib.values())
+        self._items = ()
+        self._itemsindex = None
         self._url_parts = base._url_parts
-        for child in element.getchildren():
+        self._config = base.config
+        self._images = None
+        for child in element:
             self.process_element(child)
 
     def __repr__(self):
@@ -314,14 +906,34 @@ class DataNode(MultiValue):
         if element.tag in self._viewgroups:
             child = self._viewgroups[element.tag]
         item = child(self, element.attrib.get('key', None), element)
+        if not self._items:
+            self._items, self._itemsindex = [], {}
         self._items.append(item)
+        for index in item.indices:
+            self._itemsindex.setdefault(index, []).append(item)
+
+    def get(self, key, default=NO_DEFAULT):
+        offset = self._schema.index.get(key, None)
+        if offset is not None:
+            return self._values[offset]
+        items = self._itemsindex.get(key, None) if self._itemsindex else None
+        return list(items) if items else None
+    __getitem__ = get
+
+    def __getattr__(self, key):
+        return _get_attribute(self, key)
 
     def __str__(self):
         return self.value
 
     @property
     def data(self):
-        return self._data
+        return dict(zip(self._schema.keys, self._values))
+    _data = data
+
+    @property
+    def config(self):
+        return self._config
 
     @property
     def items(self):
@@ -329,7 +941,9 @@ class DataNode(MultiValue):
 
     @property
     def element(self):
-        return self._element
+        element = ET.Element(self._schema.tag, self.data)
+        element.extend([item.element for item in self._items])
+        return element
 
     @property
     def indices(self):
@@ -340,10 +954,49 @@ class DataNode(MultiValue):
         return self.get('tag', None)
 
     def get_indices(self):
-        return [self.element.tag]
+        return [self._schema.tag]
 DataNode._default_viewgroup = DataNode
 
 
+def iter_events(resp, chunk_size=STREAM_CHUNK_SIZE):
+    if hasattr(ET, 'XMLPullParser'):
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        for chunk in resp.iter_content(chunk_size):
+            parser.feed(chunk)
+            for event in parser.read_events():
+                yield event
+        return
+    # Python 2's ElementTree has no pull parser, let iterparse read the raw socket instead, or the content of a response
+    # that was read already, such as one from the cache
+    if getattr(resp, '_content_consumed', True):
+        source = io.BytesIO(resp.content)
+    else:
+        source = resp.raw
+        source.decode_content = True
+    for event in ET.iterparse(source, events=('start', 'end')):
+        yield event
+
+
+def iter_children(request, chunk_size=STREAM_CHUNK_SIZE):
+    # Yields the root element as soon as it opens, followed by each completed child
+    resp = request._check_response(request._request(stream=True))
+    root, depth = None, 0
+    try:
+        for event, element in iter_events(resp, chunk_size):
+            if event == 'start':
+                depth += 1
+                if root is None:
+                    root = element
+                    yield root
+                continue
+            depth -= 1
+            if depth == 1:
+                root.remove(element)
+                yield element
+    finally:
+        resp.close()
+
+
 def register_viewgroup(name):
     def _inner(x):
         BaseDirectory._viewgroups[name] = x
@@ -358,6 +1011,13 @@ def register_datanode(name):
     return _inner
 
 
+def register_typegroup(name):
+    def _inner(x):
+        BaseDirectory._typegroups[name] = x
+        return x
+    return _inner
+
+
 def register_keynode(name):
     def _inner(x):
         BaseDirectory._keygroups[name] = x
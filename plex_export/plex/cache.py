@@ -0,0 +1,280 @@
+from __future__ import unicode_literals, absolute_import
+
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from six.moves.urllib import parse
+
+from .util import StoredResponse
+
+DEFAULT_CACHE_PATH = 'request-cache.sqlite'
+DEFAULT_MEMORY_SIZE = 64 * 1024 * 1024
+DEFAULT_DISK_SIZE = 1024 * 1024 * 1024
+DEFAULT_TTL = 300
+# Expired entries are kept this long so they can still be revalidated with their ETag
+DEFAULT_KEEP_EXPIRED = 24 * 60 * 60
+PURGE_INTERVAL = 1000
+DEFAULT_RULES = [
+    (r'^library/metadata/', 24 * 60 * 60),
+    (r'^status/sessions', 10),
+    (r'^library/sections/[^/]+/[^/]+', 60),
+]
+VALIDATORS = {
+    'ETag': 'If-None-Match',
+    'Last-Modified': 'If-Modified-Since',
+}
+
+__all__ = [
+    'CacheEntry',
+    'MemoryTier',
+    'SQLiteTier',
+    'ResponseCache',
+]
+
+
+def cache_key(url, headers=None):
+    scheme, netloc, path, qs, fragment = parse.urlsplit(url)
+    qs = sorted((x, y) for x, y in parse.parse_qsl(qs) if x != 'X-Plex-Token')
+    key = '%s%s' % (netloc, path)
+    if qs:
+        key = '%s?%s' % (key, parse.urlencode(qs))
+    if headers:
+        key = '%s#%s' % (key, parse.urlencode(sorted(headers.items())))
+    return key
+
+
+class CacheEntry(object):
+    __slots__ = ('content', 'headers', 'expires')
+
+    def __init__(self, content, headers=None, expires=None):
+        self.content = content
+        self.headers = headers or {}
+        self.expires = expires
+
+    @classmethod
+    def from_response(cls, resp, expires):
+        headers = dict((k, resp.headers[k]) for k in VALIDATORS if k in resp.headers)
+        return cls(resp.content, headers, expires)
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def fresh(self, now, min_fresh=0):
+        return self.expires is None or now + min_fresh < self.expires
+
+    def validators(self):
+        return dict((VALIDATORS[k], v) for k, v in self.headers.items())
+
+    def response(self):
+        return StoredResponse(self.content, 200, self.headers)
+
+
+class MemoryTier(object):
+    def __init__(self, max_size=DEFAULT_MEMORY_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        if entry.size > self.max_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+
+
+class SQLiteTier(object):
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size=DEFAULT_DISK_SIZE, keep_expired=DEFAULT_KEEP_EXPIRED):
+        self.path = path
+        self.max_size = max_size
+        self.keep_expired = keep_expired
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, expires REAL, etag TEXT, last_modified TEXT, body BLOB
+            )
+        ''')
+        self.purge()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT expires, etag, last_modified, body FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        expires, etag, last_modified, body = row
+        headers = dict((k, v) for k, v in (('ETag', etag), ('Last-Modified', last_modified)) if v)
+        return CacheEntry(bytes(body), headers, expires)
+
+    def set(self, key, entry):
+        values = (key, entry.expires, entry.headers.get('ETag', None), entry.headers.get('Last-Modified', None), sqlite3.Binary(entry.content))
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', values)
+            self._writes += 1
+            due = self._writes % PURGE_INTERVAL == 0
+        if due:
+            self.purge()
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def purge(self, now=None):
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE expires < ?', ((now or time.time()) - self.keep_expired,))
+            if not self.max_size:
+                return
+            excess = self._db.execute('SELECT COALESCE(SUM(LENGTH(body)), 0) FROM entries').fetchone()[0] - self.max_size
+            if excess <= 0:
+                return
+            # Drop the entries that expire first until the tier fits again
+            keys = []
+            for key, size in self._db.execute('SELECT key, LENGTH(body) FROM entries ORDER BY expires IS NULL, expires'):
+                if excess <= 0:
+                    break
+                keys.append((key,))
+                excess -= size
+            self._db.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+
+class ResponseCache(object):
+    def __init__(self, tiers, ttl=None, rules=None, stale=0, min_fresh=0):
+        self.tiers = tiers
+        # The built-in rules only apply when no ttl was chosen, an explicit ttl covers everything the rules do not
+        defaults = DEFAULT_RULES if ttl is None else []
+        self.ttl = (DEFAULT_TTL if ttl is None else ttl) or None
+        self.rules = [(re.compile(pattern), value) for pattern, value in (rules or []) + defaults]
+        self.stale = stale
+        self.min_fresh = min_fresh
+        self.min_ttl = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    @classmethod
+    def create(cls, kind, ttl=None, path=None, memory_size=DEFAULT_MEMORY_SIZE, disk_size=DEFAULT_DISK_SIZE, **kwargs):
+        tiers = [MemoryTier(memory_size)]
+        if kind == 'sqlite':
+            tiers.append(SQLiteTier(path or DEFAULT_CACHE_PATH, disk_size, max(DEFAULT_KEEP_EXPIRED, kwargs.get('stale', 0))))
+        return cls(tiers, ttl=ttl, **kwargs)
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, ', '.join(x.__class__.__name__ for x in self.tiers))
+
+    def ttl_for(self, url):
+        path = parse.urlsplit(url)[2].lstrip('/')
+        for pattern, value in self.rules:
+            if pattern.match(path):
+                return value
+        return self.ttl
+
+    def expires_for(self, url, now):
+        ttl = self.ttl_for(url)
+        return now + max(ttl, self.min_ttl) if ttl else None
+
+    def lookup(self, key):
+        for index, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is not None:
+                for upper in self.tiers[:index]:
+                    upper.set(key, entry)
+                return entry
+        return None
+
+    def store(self, key, entry):
+        for tier in self.tiers:
+            tier.set(key, entry)
+
+    def fresh(self, url, headers=None):
+        entry = self.lookup(cache_key(url, headers))
+        if entry is not None and entry.fresh(time.time(), self.min_fresh):
+            self._count('hits')
+            return entry.response()
+        return None
+
+    def put(self, url, headers, resp):
+        if resp.status_code == 200:
+            self.store(cache_key(url, headers), CacheEntry.from_response(resp, self.expires_for(url, time.time())))
+
+    def refresh(self, fetch, url, headers=None):
+        self._count('misses')
+        return self._fetch(fetch, url, headers, cache_key(url, headers), None)
+
+    def get(self, fetch, url, headers=None):
+        key = cache_key(url, headers)
+        entry = self.lookup(key)
+        now = time.time()
+        if entry is not None:
+            if entry.fresh(now, self.min_fresh):
+                self._count('hits')
+                return entry.response()
+            if self.stale and entry.expires + self.stale > now and not self.min_fresh:
+                self._count('hits')
+                self._refresh_later(fetch, url, headers, key, entry)
+                return entry.response()
+        self._count('misses')
+        return self._fetch(fetch, url, headers, key, entry)
+
+    def _fetch(self, fetch, url, headers, key, entry):
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.validators())
+        resp = fetch(url, headers=request_headers or None)
+        now = time.time()
+        if resp.status_code == 304 and entry is not None:
+            self._count('revalidated')
+            entry.expires = self.expires_for(url, now)
+            self.store(key, entry)
+            return entry.response()
+        if resp.status_code == 200:
+            self.store(key, CacheEntry.from_response(resp, self.expires_for(url, now)))
+        return resp
+
+    def _refresh_later(self, fetch, url, headers, key, entry):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(fetch, url, headers, key, entry)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
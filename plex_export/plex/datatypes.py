@@ -1,7 +1,14 @@
 from __future__ import unicode_literals, absolute_import
-from .base import register_datanode, register_viewgroup, register_keynode, SelfLoading, MultiValue, Directory, DataNode, image_getter
+from .base import register_datanode, register_viewgroup, register_keynode, register_typegroup, SelfLoading, MultiValue, BaseDirectory, \
+    Directory, DataNode, image_getter, NO_DEFAULT, TRUNCATED_TAGS
 
+import re
 import six
+import threading
+from six.moves.urllib import parse
+
+SECTION_PATH = re.compile(r'^/?(library/sections/[^/]+/)')
+_assemble_lock = threading.Lock()
 
 
 @register_viewgroup('Video')
@@ -10,63 +17,237 @@ class VideoItem(SelfLoading, MultiValue, Directory):
     art = image_getter('art')
 
 
+@register_typegroup('episode')
+class EpisodeItem(VideoItem):
+    pass
+
+
+@register_typegroup('track')
+class TrackItem(SelfLoading, MultiValue, Directory):
+    thumb = image_getter('thumb')
+    art = image_getter('art')
+
+
+class ItemGroup(object):
+    def __init__(self, listing, items):
+        self.listing = listing
+        self.items = items
+        self.prepared = False
+
+    def __repr__(self):
+        return "<%s: %s (%d items)>" % (self.__class__.__name__, self.listing._url_parts[2], len(self.items))
+
+    def claim(self):
+        if self.prepared:
+            return []
+        self.prepared = True
+        return self.items
+
+    def prepare(self):
+        items = self.claim()
+        if items:
+            self.listing.prepare_items(items)
+
+
+class ContainerItem(MultiValue, Directory):
+    _bulk_paths = ()
+    _crawl_children = True
+
+    def __init__(self, base, relative=None, element=None):
+        self._parent = base
+        self._group = None
+        super(ContainerItem, self).__init__(base, relative=relative, element=element)
+
+    def process_sub_element(self, element):
+        item = self.make_child(element)
+        for index in item.indices:
+            self._itemsindex.setdefault(index, []).append(item)
+
+    def get(self, key, default=NO_DEFAULT):
+        # Tags such as Genre come with the listing, loading would only add the children below it
+        if key in TRUNCATED_TAGS and key not in self._data:
+            items = self._itemsindex.get(key, None)
+            return list(items) if items else None
+        return super(ContainerItem, self).get(key, default)
+    __getitem__ = get
+
+    @property
+    def load_lock(self):
+        # Roots are assembled together with their siblings, so they load under the lock of their listing
+        if self._bulk_paths:
+            return self._parent.load_lock
+        return super(ContainerItem, self).load_lock
+
+    def bulk_listings(self):
+        return hierarchy_listings(self) if self._bulk_paths else []
+
+    def assemble(self, bulks=None):
+        if self._bulk_paths:
+            assemble_hierarchy(self, bulks)
+
+    def adopt(self, item, group):
+        self.add_item(item)
+        self._group = group
+
+    def prepare_items(self, items):
+        if self._group is None:
+            return super(ContainerItem, self).prepare_items(items)
+        self._group.prepare()
+        return items
+
+    def detail_group(self):
+        if self._group is None:
+            return super(ContainerItem, self).detail_group()
+        return self._group.listing, self._group.claim()
+
+
+@register_typegroup('season')
+class SeasonItem(ContainerItem):
+    @property
+    def episodes(self):
+        return list(self)
+
+
+@register_typegroup('show')
+class ShowItem(ContainerItem):
+    _bulk_paths = ('all?type=3', 'allLeaves')
+
+    @property
+    def seasons(self):
+        return list(self)
+
+
+@register_typegroup('album')
+class AlbumItem(ContainerItem):
+    @property
+    def tracks(self):
+        return list(self)
+
+
+@register_typegroup('artist')
+class ArtistItem(ContainerItem):
+    _bulk_paths = ('all?type=9', 'allLeaves')
+
+    @property
+    def albums(self):
+        return list(self)
+
+
+def _index(item):
+    try:
+        return int(item._data.get('index', 0))
+    except ValueError:
+        return 0
+
+
+def hierarchy_listings(root):
+    listing = root._parent
+    match = SECTION_PATH.match(listing._url_parts[2]) if isinstance(listing, BaseDirectory) else None
+    if root._loaded or match is None or not listing._loaded:
+        return []
+    return [BaseDirectory(listing, '/%s%s' % (match.group(1), path)) for path in root._bulk_paths]
+
+
+def assemble_hierarchy(root, bulks=None):
+    # Fetch every level below the roots of a section listing in bulk instead of one request per show and season
+    with _assemble_lock:
+        bulks = hierarchy_listings(root) if bulks is None else bulks
+        if root._loaded or not bulks:
+            return
+        parents = dict((item._data.get('ratingKey', None), item) for item in root._parent.items
+                       if isinstance(item, root.__class__) and not item._loaded)
+        for bulk in bulks:
+            group = ItemGroup(bulk, [])
+            children = {}
+            for item in bulk.items:
+                parent = parents.get(item._data.get('parentRatingKey', None), None)
+                if parent is None:
+                    continue
+                group.items.append(item)
+                parent.adopt(item, group)
+                if isinstance(item, ContainerItem):
+                    children[item._data.get('ratingKey', None)] = item
+            for parent in parents.values():
+                parent._items.sort(key=_index)
+                parent._loaded = True
+            parents = children
+
+
 @register_viewgroup('Media')
 @register_datanode('Media')
 class MediaItem(DataNode):
-    pass
+    __slots__ = ()
 
 
 @register_datanode('Part')
 class PartItem(DataNode):
-    pass
+    __slots__ = ()
 
 
 @register_datanode('Stream')
 class StreamItem(DataNode):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Genre')
 class GenreItem(DataNode):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Role')
 class RoleItem(DataNode):
+    __slots__ = ()
     thumb = image_getter('thumb')
 
 
 @register_viewgroup('Director')
 class DirectorItem(RoleItem):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Writer')
 class WriterItem(RoleItem):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Producer')
 class ProducerItem(RoleItem):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Collection')
 class CollectionItem(DataNode):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Country')
 class CountryItem(DataNode):
-    pass
+    __slots__ = ()
 
 
 @register_viewgroup('Server')
 class ServerItem(DataNode):
+    __slots__ = ()
+
     @property
     def value(self):
         return self.name
 
+    @property
+    def plex_url(self):
+        scheme, netloc, path, qs, fragment = self._url_parts
+        return parse.urlunsplit((scheme, '%s:%s' % (self.address, self.port), '/', qs, ''))
+
+
+class SectionItem(Directory):
+    pass
+
+
+@register_keynode('library/sections/')
+class SectionListing(Directory):
+    def make_child(self, element):
+        return SectionItem(self, element.attrib.get('key', None), element)
+
 
 @register_keynode('servers/')
 class ServerListing(Directory):
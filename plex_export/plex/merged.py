@@ -0,0 +1,51 @@
+from __future__ import unicode_literals, absolute_import
+
+import six
+
+from .base import BaseDirectory, NO_DEFAULT
+
+__all__ = [
+    'MergedCollection',
+]
+
+
+class MergedCollection(object):
+    def __init__(self, members):
+        self.members = [x for x in members if x is not None]
+
+    def __repr__(self):
+        return "<%s: %d members>" % (self.__class__.__name__, len(self.members))
+
+    def __iter__(self):
+        for member in self.members:
+            for item in member:
+                yield item
+
+    def __len__(self):
+        return sum(len(x) for x in self.members)
+
+    def __bool__(self):
+        return any(self.members)
+    __nonzero__ = __bool__
+
+    def get(self, key, default=NO_DEFAULT):
+        values = [x.get(key, None) for x in self.members]
+        directories = [x for x in values if isinstance(x, BaseDirectory)]
+        if directories:
+            return MergedCollection(directories)
+        for value in values:
+            if value is not None:
+                return value
+        if default is NO_DEFAULT:
+            raise KeyError(key)
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, six.integer_types):
+            return list(self)[key]
+        return self.get(key)
+
+    def __getattr__(self, key):
+        if key.startswith('__'):
+            raise AttributeError(key)
+        return self.get(key, None)
@@ -0,0 +1,209 @@
+from __future__ import unicode_literals, absolute_import
+
+import os
+import re
+import time
+import zlib
+import sqlite3
+import threading
+from six.moves.urllib import parse
+
+from .. import exceptions
+from .base import ET, RequestConfig, PlexServer
+from .util import StoredResponse, _strip_token
+
+try:
+    from ..version_info import __version__
+except ImportError:
+    __version__ = '0.0.0'
+
+MMAP_SIZE = 256 * 1024 * 1024
+METADATA = re.compile(r'^library/metadata/(\d+(?:,\d+)*)$')
+
+__all__ = [
+    'Snapshot',
+    'SnapshotConfig',
+    'SnapshotPlexServer',
+]
+
+
+def snapshot_key(url):
+    scheme, netloc, path, qs, fragment = parse.urlsplit(url)
+    qs = sorted((x, y) for x, y in parse.parse_qsl(qs) if x != 'X-Plex-Token')
+    path = path.strip('/')
+    if qs:
+        return '%s?%s' % (path, parse.urlencode(qs))
+    return path
+
+
+def item_version(element):
+    return element.attrib.get('updatedAt', None) or element.attrib.get('addedAt', None)
+
+
+def _container(root, children):
+    container = ET.Element(root.tag, dict(root.attrib, size=str(len(children))))
+    for child in children:
+        container.append(child)
+    return ET.tostring(container)
+
+
+class Snapshot(object):
+    def __init__(self, path, mode='r'):
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._target = None
+        self._used = set()
+        if mode == 'w':
+            self._target = path
+            self.path = '%s.tmp' % path
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        elif mode == 'r' and not os.path.exists(path):
+            raise IOError("snapshot '%s' does not exist" % path)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        if mode in ('w', 'a'):
+            self._db.executescript('''
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, version TEXT, body BLOB);
+            ''')
+        self._db.execute('PRAGMA mmap_size=%d' % MMAP_SIZE)
+        self._meta = dict(self._db.execute('SELECT key, value FROM meta'))
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.path)
+
+    @property
+    def url(self):
+        return self._meta.get('url', None)
+
+    def set_meta(self, key, value):
+        self._meta[key] = value
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def _put(self, key, content, version=None):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (key, version, sqlite3.Binary(zlib.compress(content))))
+
+    def _get(self, key, version=None):
+        with self._lock:
+            if version is None:
+                row = self._db.execute('SELECT body FROM responses WHERE key = ?', (key,)).fetchone()
+            else:
+                row = self._db.execute('SELECT body FROM responses WHERE key = ? AND version = ?', (key, version)).fetchone()
+        return zlib.decompress(bytes(row[0])) if row else None
+
+    def store(self, url, content):
+        key = snapshot_key(url)
+        if not METADATA.match(key):
+            return self._put(key, content)
+        self.store_details(url, content)
+
+    def store_details(self, url, content):
+        if not METADATA.match(snapshot_key(url)):
+            return
+        # Keep metadata per item, so it can be served for any batch size and checked against updatedAt later on
+        root = ET.fromstring(content)
+        for child in list(root):
+            rating_key = child.attrib.get('ratingKey', None)
+            if rating_key:
+                self._used.add('library/metadata/%s' % rating_key)
+                self._put('library/metadata/%s' % rating_key, _container(root, [child]), item_version(child))
+
+    def detail(self, rating_key, version):
+        if not rating_key or not version:
+            return None
+        self._used.add('library/metadata/%s' % rating_key)
+        return self._get('library/metadata/%s' % rating_key, version)
+
+    def prune(self):
+        # Drops every response the current export did not use, such as the details of items that left the library
+        with self._lock:
+            self._db.execute('CREATE TEMP TABLE IF NOT EXISTS used (key TEXT PRIMARY KEY)')
+            self._db.execute('DELETE FROM used')
+            self._db.executemany('INSERT OR IGNORE INTO used VALUES (?)', [(x,) for x in self._used])
+            count = self._db.execute('DELETE FROM responses WHERE key NOT IN (SELECT key FROM used)').rowcount
+            self._db.execute('DELETE FROM used')
+        return count
+
+    def load(self, url):
+        key = snapshot_key(url)
+        match = METADATA.match(key)
+        if not match or ',' not in key:
+            return self._get(key)
+        root, children = None, []
+        for rating_key in match.group(1).split(','):
+            content = self._get('library/metadata/%s' % rating_key)
+            if content is None:
+                continue
+            item = ET.fromstring(content)
+            root = item if root is None else root
+            children.extend(list(item))
+        if root is None:
+            return None
+        return _container(root, children)
+
+    def close(self):
+        if self._db is None:
+            return
+        self._db.commit()
+        self._db.close()
+        self._db = None
+        if self._target:
+            getattr(os, 'replace', os.rename)(self.path, self._target)
+            self.path, self._target = self._target, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._target:
+            self._db.close()
+            self._db = None
+            os.unlink(self.path)
+            return
+        self.close()
+
+
+class SnapshotConfig(RequestConfig):
+    def __init__(self, session=None, snapshot=None, **options):
+        super(SnapshotConfig, self).__init__(session=session, **options)
+        self.snapshot = snapshot
+
+    def get(self, url, *args, **kwargs):
+        with self._lock:
+            self.request_count += 1
+        content = self.snapshot.load(url)
+        if content is None:
+            raise exceptions.NotInSnapshotException(snapshot_key(url))
+        return StoredResponse(content)
+
+    def get_image(self, url, version=None):
+        if self.image_cache is None:
+            return None
+        return self.image_cache.get(self.image_cache.key(url, version))
+
+
+class SnapshotPlexServer(PlexServer):
+    config_class = SnapshotConfig
+
+    def __init__(self, path, **options):
+        options.pop('cache', None)
+        snapshot = Snapshot(path) if not isinstance(path, Snapshot) else path
+        super(SnapshotPlexServer, self).__init__(snapshot.url, snapshot=snapshot, **options)
+
+
+def record(plex, path, workers=None):
+    with Snapshot(path, 'w') as snapshot:
+        snapshot.set_meta('url', _strip_token(plex.url))
+        snapshot.set_meta('version', __version__)
+        snapshot.set_meta('created', str(int(time.time())))
+        if plex._xml is not None:
+            snapshot.store(plex.url, ET.tostring(plex._xml))
+        plex.config.recorder = snapshot
+        try:
+            plex.crawl(workers)
+        finally:
+            plex.config.recorder = None
+    return snapshot
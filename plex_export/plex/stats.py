@@ -0,0 +1,138 @@
+from __future__ import unicode_literals, absolute_import
+
+import re
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from six.moves.urllib import parse
+
+__all__ = [
+    'Stats',
+]
+
+
+def endpoint_pattern(url):
+    path = parse.urlsplit(url)[2].rstrip('/') or '/'
+    path = re.sub(r'/\d+(,\d+)+(?=/|$)', '/:ids', path)
+    return re.sub(r'/\d+(?=/|$)', '/:id', path)
+
+
+def template_location():
+    frame = sys._getframe(1)
+    while frame is not None:
+        template = frame.f_globals.get('__jinja_template__', None)
+        if template is not None:
+            return '%s:%s' % (template.name or template.filename, template.get_corresponding_lineno(frame.f_lineno))
+        frame = frame.f_back
+    return None
+
+
+def _size(value):
+    for unit in ['B', 'KB', 'MB']:
+        if value < 1024:
+            return '%.1f %s' % (value, unit)
+        value /= 1024.0
+    return '%.1f GB' % value
+
+
+class Stats(object):
+    def __init__(self):
+        self.endpoints = {}
+        self.images = {'count': 0, 'bytes': 0, 'time': 0.0, 'cached': 0}
+        self.parse_time = 0.0
+        self.build_time = 0.0
+        self.elements = 0
+        self.lazy_loads = {}
+        self.render_time = 0.0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<%s: %d requests>" % (self.__class__.__name__, self.request_count)
+
+    @property
+    def request_count(self):
+        return sum(x['count'] for x in self.endpoints.values())
+
+    @property
+    def request_bytes(self):
+        return sum(x['bytes'] for x in self.endpoints.values())
+
+    def record_request(self, url, size, elapsed):
+        pattern = endpoint_pattern(url)
+        with self._lock:
+            endpoint = self.endpoints.setdefault(pattern, {'count': 0, 'bytes': 0, 'time': 0.0})
+            endpoint['count'] += 1
+            endpoint['bytes'] += size
+            endpoint['time'] += elapsed
+
+    def record_image(self, size, elapsed, cached=False):
+        with self._lock:
+            self.images['count'] += 1
+            self.images['bytes'] += size
+            self.images['time'] += elapsed
+            self.images['cached'] += int(cached)
+
+    def record_lazy_load(self, obj):
+        location = template_location() or '<python>'
+        with self._lock:
+            self.lazy_loads[location] = self.lazy_loads.get(location, 0) + 1
+
+    @contextmanager
+    def timer(self, attr, elements=0):
+        started = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                setattr(self, attr, getattr(self, attr) + time.time() - started)
+                self.elements += elements
+
+    def report(self, cache=None):
+        data = {
+            'elapsed': time.time() - self.started,
+            'requests': {
+                'count': self.request_count,
+                'bytes': self.request_bytes,
+                'endpoints': self.endpoints,
+            },
+            'images': self.images,
+            'parse_time': self.parse_time,
+            'build_time': self.build_time,
+            'elements': self.elements,
+            'lazy_loads': {
+                'count': sum(self.lazy_loads.values()),
+                'locations': self.lazy_loads,
+            },
+            'render_time': self.render_time,
+        }
+        if cache is not None:
+            total = cache.hits + cache.misses
+            data['cache'] = {
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'revalidated': cache.revalidated,
+                'hit_ratio': float(cache.hits) / total if total else 0.0,
+            }
+        return data
+
+    def to_json(self, cache=None):
+        return json.dumps(self.report(cache), indent=2, sort_keys=True)
+
+    def format(self, cache=None):
+        data = self.report(cache)
+        requests = data['requests']
+        lines = ["Requests: %d (%s) in %.2fs" % (requests['count'], _size(requests['bytes']), data['elapsed'])]
+        for pattern, endpoint in sorted(self.endpoints.items(), key=lambda x: -x[1]['time']):
+            lines.append("  %-40s %6d %10s %8.2fs" % (pattern, endpoint['count'], _size(endpoint['bytes']), endpoint['time']))
+        if 'cache' in data:
+            lines.append("Cache: %(hits)d hits, %(misses)d misses, %(revalidated)d revalidated (%(hit_ratio).0f%% hit ratio)" % dict(data['cache'], hit_ratio=data['cache']['hit_ratio'] * 100))
+        lines.append("Images: %d loaded (%s) in %.2fs, %d from the image cache" % (self.images['count'], _size(self.images['bytes']), self.images['time'], self.images['cached']))
+        lines.append("Parsing: %.2fs, building %d objects: %.2fs" % (self.parse_time, self.elements, self.build_time))
+        lines.append("Lazy loads: %d" % data['lazy_loads']['count'])
+        for location, count in sorted(self.lazy_loads.items(), key=lambda x: -x[1]):
+            lines.append("  %-40s %6d" % (location, count))
+        lines.append("Render: %.2fs" % self.render_time)
+        return '\n'.join(lines)
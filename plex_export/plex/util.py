@@ -1,9 +1,15 @@
 from __future__ import unicode_literals, absolute_import
+import os
 import base64
+import errno
+import hashlib
 import imghdr
-import requests
+import tempfile
+from six.moves import intern
 from six.moves.urllib import parse
 
+INTERN_MAX_LENGTH = 32
+
 
 def _join_plex(x, y):
     url = parse.urljoin(x, y)
@@ -12,6 +18,67 @@ def _join_plex(x, y):
     return url
 
 
+class StoredResponse(object):
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _intern(value):
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return intern(value)
+    return value
+
+
+def _strip_token(url):
+    scheme, netloc, path, qs, fragment = parse.urlsplit(url)
+    qs = parse.urlencode([(x, y) for x, y in parse.parse_qsl(qs) if x != 'X-Plex-Token'])
+    return parse.urlunsplit((scheme, netloc, path, qs, ''))
+
+
+class ImageCache(object):
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+
+    def __repr__(self):
+        return "<%s: %s>" % (self.__class__.__name__, self.path)
+
+    def key(self, url, version=None):
+        raw = '%s|%s' % (_strip_token(url), version or '')
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(self.filename(key), 'rb') as fh:
+                return fh.read()
+        except (IOError, OSError):
+            return None
+
+    def set(self, key, data):
+        filename = self.filename(key)
+        dname = os.path.dirname(filename)
+        try:
+            os.makedirs(dname)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp = tempfile.mkstemp(dir=dname)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        getattr(os, 'replace', os.rename)(tmp, filename)
+
+
 class ImgHelper(object):
     def __init__(self, base, url):
         b_schema, b_netloc, b_path, b_qs, b_fragment = base._url_parts
@@ -19,27 +86,57 @@ class ImgHelper(object):
         self._path = url
         self._data = None
         self._data_type = None
+        self._base = base
+        self._config = base.config
+        self._version = base._data.get('updatedAt', None)
+        self._variants = {}
+        self._asset = None
         if u_netloc and u_netloc != b_netloc:
             self._url = url
         else:
             b_path = _join_plex(b_path, u_path)
             data = parse.parse_qsl(b_qs)
-            b_qs = parse.urlencode([(x, y) for x, y in data if x == 'X-Plex-Token'])
+            b_qs = parse.urlencode(parse.parse_qsl(u_qs) + [(x, y) for x, y in data if x == 'X-Plex-Token'])
             self._url = parse.urlunsplit((b_schema, b_netloc, b_path, b_qs, b_fragment))
 
     def load(self):
         if self._data:
             return
-        response = requests.get(self._url)
-        if not response.status_code == 200:
+        if self._config.collected_images is not None:
+            self._config.collected_images.append(self)
             return
-        self._data = response.content
-        self._data_type = imghdr.what(None, self._data)
+        self.set_data(self._config.get_image(self._url, self._version))
+
+    def set_data(self, data):
+        self._data = data
+        self._data_type = imghdr.what(None, data) if data else None
+
+    def sized(self, width, height=None):
+        key = (width, height)
+        if key not in self._variants:
+            query = parse.urlencode([
+                ('width', width),
+                ('height', height or width),
+                ('minSize', 1),
+                ('upscale', 1),
+                ('url', self._path),
+            ])
+            self._variants[key] = self.__class__(self._base, '/photo/:/transcode?%s' % query)
+        return self._variants[key]
+
+    def asset_url(self):
+        if self._asset is None and self._config.assets is not None and self.data:
+            self._asset = self._config.assets.store(self._data, self._data_type)
+            # The asset is on its way to disk, no need to keep the image around
+            self._data = None
+        return self._asset
 
     def base64_encoded(self):
+        if self._config.assets is not None:
+            return self.asset_url()
         if not self.data:
             return
-        return "data:image/%(dt)s;base64,%(b64)s" % {'dt': self._data_type, 'b64': base64.urlsafe_b64encode(self._data)}
+        return "data:image/%(dt)s;base64,%(b64)s" % {'dt': self._data_type, 'b64': base64.b64encode(self._data).decode('ascii')}
 
     @property
     def url(self):
@@ -56,17 +153,15 @@ class ImgHelper(object):
 
 def image_getter(attr):
     def __inner(self):
-        img = None
-        try:
-            img = getattr(self, '_img_%s' % attr, None)
-        except KeyError:
-            pass
+        images = self._images
+        if images is None:
+            images = self._images = {}
+        img = images.get(attr, None)
         if img:
             return img
         value = self.get(attr)
         if not value:
             return None
-        img = ImgHelper(self, value)
-        setattr(self, '_img_%s' % attr, img)
+        img = images[attr] = ImgHelper(self, value)
         return img
     return property(__inner)
@@ -0,0 +1,156 @@
+from __future__ import unicode_literals, absolute_import
+
+import sys
+import time
+import requests
+from contextlib import contextmanager
+
+from .plex.base import BaseDirectory, ET, DEFAULT_BATCH_SIZE, crawl_items
+
+DEFAULT_INTERVAL = 60
+DEFAULT_DEBOUNCE = 5
+DEFAULT_MAX_BACKOFF = 15 * 60
+MAX_DEBOUNCE_ROUNDS = 10
+TRANSIENT_ERRORS = (requests.RequestException, ET.ParseError, EnvironmentError)
+
+__all__ = [
+    'Watcher',
+]
+
+
+def _loaded_child(node, key):
+    if node is None or not node._loaded:
+        return None
+    return node._itemsdict.get(key, None)
+
+
+@contextmanager
+def _uncached(plex):
+    # Changes are detected by fetching again what the cache may still hold from before they happened
+    config = plex.config
+    previous, config.bypass_cache = config.bypass_cache, True
+    try:
+        yield
+    finally:
+        config.bypass_cache = previous
+
+
+class ServerState(object):
+    def __init__(self, plex):
+        self.plex = plex
+        self.sections = {}
+        self.recent = {}
+        self.changed = set()
+        self.stale = set()
+
+    def __repr__(self):
+        return "<%s: %r>" % (self.__class__.__name__, self.plex)
+
+    def indicators(self):
+        sections = BaseDirectory(self.plex, 'library/sections')
+        recent = BaseDirectory(self.plex, 'library/recentlyAdded')
+        with _uncached(self.plex):
+            return (
+                dict((x._data.get('key', None), x._data.get('updatedAt', None)) for x in sections.items),
+                dict((x._data.get('ratingKey', None), x._data) for x in recent.items if x._data.get('ratingKey', None)),
+            )
+
+    def start(self):
+        self.sections, self.recent = self.indicators()
+
+    def update(self):
+        # Changes are kept until they were invalidated, so they survive a poll that failed halfway
+        sections, recent = self.indicators()
+        changed = set(key for key, updated in sections.items() if self.sections.get(key, None) != updated)
+        changed.update(set(self.sections) - set(sections))
+        stale = set()
+        for key, data in recent.items():
+            previous = self.recent.get(key, None)
+            if previous is None or previous.get('updatedAt', None) != data.get('updatedAt', None):
+                changed.add(data.get('librarySectionID', None))
+                stale.update(x for x in (key, data.get('parentRatingKey', None), data.get('grandparentRatingKey', None)) if x)
+        self.sections, self.recent = sections, recent
+        self.changed.update(changed)
+        self.stale.update(stale)
+        return bool(self.changed)
+
+    def invalidate(self):
+        library = _loaded_child(self.plex, 'library')
+        listing = _loaded_child(library, 'sections')
+        count = 0
+        if listing is not None:
+            with _uncached(self.plex):
+                count = self.refresh(listing)
+        self.changed, self.stale = set(), set()
+        return count
+
+    def refresh(self, listing):
+        if set(x._data.get('key', None) for x in listing._items) != set(self.sections):
+            listing.refresh()
+        count = 0
+        for section in listing._items:
+            if None not in self.changed and section._data.get('key', None) not in self.changed:
+                continue
+            items = _loaded_child(section, 'all')
+            if items is None:
+                continue
+            refreshed = items.refresh(self.stale)
+            # What replaced the changed items is loaded here, while the cache is bypassed, instead of while rendering
+            crawl_items(refreshed, self.plex.config.batch_size or DEFAULT_BATCH_SIZE)
+            count += len(refreshed)
+        return count
+
+
+class Watcher(object):
+    def __init__(self, servers, render, interval=DEFAULT_INTERVAL, debounce=DEFAULT_DEBOUNCE, sleep=time.sleep,
+                 max_backoff=DEFAULT_MAX_BACKOFF):
+        self.states = [ServerState(plex) for plex in servers]
+        self.render = render
+        self.interval = interval
+        self.debounce = debounce
+        self.sleep = sleep
+        self.max_backoff = max(interval, max_backoff)
+        self.renders = 0
+        self.errors = 0
+        for state in self.states:
+            state.start()
+
+    def __repr__(self):
+        return "<%s: %d servers>" % (self.__class__.__name__, len(self.states))
+
+    def poll(self):
+        changed = False
+        for state in self.states:
+            if state.update():
+                count = state.invalidate()
+                sys.stderr.write("%s changed, reloading %d items\n" % (state.plex.friendlyName, count))
+                changed = True
+        return changed
+
+    def run(self, polls=None):
+        count, delay, pending = 0, self.interval, False
+        while polls is None or count < polls:
+            self.sleep(delay)
+            count += 1
+            try:
+                pending = self.poll() or pending
+                if pending:
+                    self.render_changes()
+                    pending = False
+            except TRANSIENT_ERRORS as e:
+                # The server may be restarting or unreachable for a while, so wait longer before each retry
+                self.errors += 1
+                delay = min(delay * 2, self.max_backoff)
+                sys.stderr.write("Watching failed: %s, retrying in %ds\n" % (e, delay))
+                continue
+            delay = self.interval
+
+    def render_changes(self):
+        for _ in range(MAX_DEBOUNCE_ROUNDS if self.debounce else 0):
+            self.sleep(self.debounce)
+            if not self.poll():
+                break
+        started = time.time()
+        self.render()
+        self.renders += 1
+        sys.stderr.write("Rendered in %.2fs\n" % (time.time() - started))
@@ -30,7 +30,7 @@ CLASSIFIERS = """
     Topic :: Utilities
 """
 
-PACKAGES_EXCLUDE = ['tests', 'tests.*', 'docs', 'docs.*']
+PACKAGES_EXCLUDE = ['tests', 'tests.*', 'docs', 'docs.*', 'benchmarks', 'benchmarks.*']
 
 CONSOLE_SCRIPTS = [
     'plex-export = plex_export:export',
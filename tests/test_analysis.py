@@ -0,0 +1,75 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from jinja2 import Environment, DictLoader
+
+from benchmarks.fakeplex import FakePlexServer, Library
+from plex_export import export
+from plex_export.analysis import analyze_template
+
+NESTED_TEMPLATES = {
+    'lookup.txt': '{% for movie in server.library.sections.movie.all %}{{ movie.Media[0].Part[0].Stream[0].codec }}\n{% endfor %}',
+    'loop.txt': '{% for movie in server.library.sections.movie.all %}'
+                '{% for stream in movie.Media[0].Part[0].Stream %}{{ stream.codec }} {% endfor %}\n{% endfor %}',
+}
+
+
+def analyze(source):
+    return analyze_template(Environment(loader=DictLoader({'template': source})), 'template')
+
+
+class AnalysisTest(unittest.TestCase):
+    def test_fields(self):
+        analysis = analyze('{% for movie in movies %}{{ movie.title }} {{ movie["year"] }} {{ movie.Genre|join(", ") }}{% endfor %}')
+        self.assertEqual(analysis.fields, set(['title', 'year', 'Genre']))
+        self.assertFalse(analysis.dynamic)
+
+    def test_nested_fields(self):
+        for source in NESTED_TEMPLATES.values():
+            analysis = analyze(source)
+            self.assertTrue(set(['Media', 'Part', 'Stream']) <= analysis.fields, source)
+
+    def test_string_methods(self):
+        analysis = analyze('{% for movie in movies %}{{ movie.title.upper() }}{% endfor %}')
+        self.assertEqual(analysis.fields, set(['title']))
+
+    def test_dynamic(self):
+        self.assertTrue(analyze('{% for movie in movies %}{{ movie[key] }}{% endfor %}').dynamic)
+        self.assertTrue(analyze('{% for movie in movies %}{{ describe(movie) }}{% endfor %}').dynamic)
+
+    def test_sections(self):
+        self.assertEqual(analyze('{{ server.library.sections.movie.all|length }}').sections, set(['movie']))
+        self.assertIsNone(analyze('{% for section in library.sections %}{% endfor %}').sections)
+
+
+class NestedAccessTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name, source in NESTED_TEMPLATES.items():
+            with io.open(os.path.join(self.tmpdir, name), 'w', encoding='utf-8') as fh:
+                fh.write(source)
+        self.server = FakePlexServer(Library(movies=5)).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def render(self, name, *args):
+        outfile = os.path.join(self.tmpdir, 'output.txt')
+        export([self.server.url, os.path.join(self.tmpdir, name), outfile] + list(args))
+        with io.open(outfile, encoding='utf-8') as fh:
+            return fh.read()
+
+    def test_nested_access(self):
+        for name in NESTED_TEMPLATES:
+            output = self.render(name)
+            self.assertEqual(output, self.render(name, '--no-field-analysis'))
+            self.assertIn('h264', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from plex_export.plex.cache import ResponseCache, MemoryTier, DEFAULT_TTL
+
+
+class TTLTest(unittest.TestCase):
+    def test_default_rules(self):
+        cache = ResponseCache([MemoryTier()])
+        self.assertEqual(cache.ttl_for('http://plex:32400/library/metadata/1'), 24 * 60 * 60)
+        self.assertEqual(cache.ttl_for('http://plex:32400/library/sections/1/all'), 60)
+        self.assertEqual(cache.ttl_for('http://plex:32400/library'), DEFAULT_TTL)
+
+    def test_ttl_overrides_default_rules(self):
+        cache = ResponseCache([MemoryTier()], ttl=3600)
+        self.assertEqual(cache.ttl_for('http://plex:32400/library/metadata/1'), 3600)
+        self.assertEqual(cache.ttl_for('http://plex:32400/library/sections/1/all'), 3600)
+
+    def test_rules_override_ttl(self):
+        cache = ResponseCache([MemoryTier()], ttl=3600, rules=[(r'^library/sections/', 10)])
+        self.assertEqual(cache.ttl_for('http://plex:32400/library/sections/1/all'), 10)
+        self.assertEqual(cache.ttl_for('http://plex:32400/library/metadata/1'), 3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
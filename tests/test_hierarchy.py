@@ -0,0 +1,72 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from six.moves import StringIO
+
+from benchmarks.fakeplex import FakePlexServer, Library
+from plex_export import export
+from plex_export.plex import PlexServer
+
+BULK_LISTINGS = ['/library/sections/2/all/?type=3', '/library/sections/2/allLeaves/']
+TEMPLATES = {
+    'genres.txt': '{% for show in server.library.sections.show.all %}{{ show.title }} {{ show.Genre|join(", ") }}\n{% endfor %}',
+    'twice.txt': '{% for pass in [1, 2] %}{% for movie in server.library.sections.movie.all %}'
+                 '{{ movie.title }} {{ movie.Writer|join(", ") }}\n{% endfor %}{% endfor %}',
+}
+
+
+class HierarchyTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakePlexServer(Library(movies=2, shows=3, seasons=2, episodes=2)).start()
+        self.shows = PlexServer(self.server.url).library.sections.show.all
+        self.shows.load()
+        self.server.reset()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_tags_from_listing(self):
+        genres = [[genre.tag for genre in show.Genre] for show in self.shows]
+        self.assertTrue(all(genres))
+        self.assertEqual(self.server.requests, [])
+
+    def test_bulk_assembly(self):
+        episodes = [episode.title for show in self.shows for season in show for episode in season]
+        self.assertEqual(len(episodes), 3 * 2 * 2)
+        self.assertEqual(sorted(self.server.requests), BULK_LISTINGS)
+
+
+class DecisionReportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name, source in TEMPLATES.items():
+            with io.open(os.path.join(self.tmpdir, name), 'w', encoding='utf-8') as fh:
+                fh.write(source)
+        self.server = FakePlexServer(Library(movies=5, shows=4)).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def report(self, name):
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            export([self.server.url, os.path.join(self.tmpdir, name), os.path.join(self.tmpdir, 'output.txt'), '-v'])
+            return sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+
+    def test_containers_are_not_reported(self):
+        self.assertNotIn('loaded details', self.report('genres.txt'))
+
+    def test_items_are_counted_once(self):
+        self.assertIn('/library/sections/1/all/: loaded details of 5 items for Writer', self.report('twice.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
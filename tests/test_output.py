@@ -0,0 +1,34 @@
+from __future__ import unicode_literals, absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from six.moves import StringIO
+
+from plex_export import export
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plex_export', 'templates', 'movies.txt')
+
+
+class OutputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_missing_directory(self):
+        outfile = os.path.join(self.tmpdir, 'missing', 'output.txt')
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            # Nothing listens on the discard port, the directory is checked before connecting
+            self.assertRaises(SystemExit, export, ['http://127.0.0.1:9/', TEMPLATE, outfile])
+            self.assertIn("can't write '%s'" % outfile, sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.fakeplex import FakePlexServer, Library
+from plex_export import export
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'templates')
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = FakePlexServer(Library(movies=5, shows=3, artists=2)).start()
+        self.snapshot = os.path.join(self.tmpdir, 'library.snapshot')
+        export(['snapshot', self.server.url, self.snapshot])
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def render(self, source, template, *args):
+        outfile = os.path.join(self.tmpdir, 'output.txt')
+        export([source, os.path.join(TEMPLATE_DIR, template), outfile] + list(args))
+        with io.open(outfile, encoding='utf-8') as fh:
+            return fh.read()
+
+    def assertReplays(self, template, *args):
+        expected = self.render(self.server.url, template, *args)
+        self.server.reset()
+        self.assertEqual(self.render(self.snapshot, template, '--from-snapshot', *args), expected)
+        self.assertEqual(self.server.requests, [])
+
+    def test_shows(self):
+        self.assertReplays('shows.txt')
+
+    def test_music(self):
+        self.assertReplays('music.txt')
+
+    def test_details(self):
+        self.assertReplays('shows.txt', '--no-field-analysis')
+        self.assertReplays('music.txt', '--no-field-analysis')
+
+
+if __name__ == '__main__':
+    unittest.main()
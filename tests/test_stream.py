@@ -0,0 +1,60 @@
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.fakeplex import FakePlexServer, Library
+from plex_export import export
+from plex_export.plex import base
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'templates')
+
+
+class WithoutPullParser(object):
+    def __init__(self, module):
+        self.module = module
+
+    def __getattr__(self, key):
+        if key == 'XMLPullParser':
+            raise AttributeError(key)
+        return getattr(self.module, key)
+
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = FakePlexServer(Library(movies=30, shows=3, artists=2)).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def render(self, template, *args):
+        self.server.reset()
+        outfile = os.path.join(self.tmpdir, 'output.txt')
+        export([self.server.url, os.path.join(TEMPLATE_DIR, template), outfile] + list(args))
+        with io.open(outfile, encoding='utf-8') as fh:
+            return fh.read(), len(self.server.requests)
+
+    def test_bulk_listings(self):
+        for template in ('shows.txt', 'music.txt'):
+            self.assertEqual(self.render(template, '--stream'), self.render(template))
+
+    def test_without_pull_parser(self):
+        # Python 2 has no pull parser and parses the raw response, or the content of a cached one
+        expected, requests = self.render('listing.txt')
+        base.ET = WithoutPullParser(base.ET)
+        try:
+            self.assertEqual(self.render('listing.txt', '--stream'), (expected, requests))
+            cache = ['--stream', '--cache', 'sqlite', '--cache-path', os.path.join(self.tmpdir, 'cache.sqlite')]
+            self.assertEqual(self.render('listing.txt', *cache)[0], expected)
+            self.assertEqual(self.render('listing.txt', *cache), (expected, 0))
+        finally:
+            base.ET = base.ET.module
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+from __future__ import unicode_literals, absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from benchmarks.fakeplex import FakePlexServer, Library
+from plex_export import export
+from plex_export.plex import cache
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'templates')
+
+
+class Clock(object):
+    def __init__(self, offset):
+        self.offset = offset
+
+    def time(self):
+        return time.time() + self.offset
+
+    def __getattr__(self, key):
+        return getattr(time, key)
+
+
+class WarmTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = FakePlexServer(Library(movies=5, shows=2, artists=2)).start()
+        self.cache = ['--cache', 'sqlite', '--cache-path', os.path.join(self.tmpdir, 'cache.sqlite')]
+
+    def tearDown(self):
+        cache.time = time
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def export(self, template, *args):
+        export([self.server.url, os.path.join(TEMPLATE_DIR, template), os.path.join(self.tmpdir, 'output.txt')] + self.cache + list(args))
+
+    def listing_requests(self):
+        return [x for x in self.server.requests if x.startswith('/library/sections/') and x.count('/') > 3]
+
+    def assertWarm(self, *args):
+        export(['warm', self.server.url] + self.cache + list(args))
+        # The export runs two minutes later, when the built-in one minute ttl of section listings has passed
+        cache.time = Clock(120)
+        self.server.reset()
+        self.export('shows.txt')
+        self.export('music.txt')
+        self.assertEqual(self.listing_requests(), [])
+
+    def test_listings_stay_warm(self):
+        self.assertWarm()
+
+    def test_listings_stay_warm_with_cachetime(self):
+        self.assertWarm('-C', '3600')
+
+
+if __name__ == '__main__':
+    unittest.main()
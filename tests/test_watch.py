@@ -0,0 +1,88 @@
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+from benchmarks.fakeplex import FakePlexServer, Library, KIND_BASE, MOVIE, EPISODE
+from plex_export.plex import PlexServer
+from plex_export.watch import Watcher
+
+
+def titles(plex):
+    return [movie.title for movie in plex.library.sections.movie.all]
+
+
+def episode_titles(plex):
+    return [episode.title for show in plex.library.sections.show.all for season in show for episode in season]
+
+
+class WatchTest(unittest.TestCase):
+    def setUp(self):
+        self.library = Library(movies=5, shows=2, seasons=2, episodes=3)
+        self.server = FakePlexServer(self.library).start()
+        self.plex = PlexServer(self.server.url, cache='memory')
+        self.titles = titles
+        self.outputs = [titles(self.plex)]
+        self.delays = []
+        self.changes = []
+
+    def tearDown(self):
+        self.server.stop()
+
+    def render(self):
+        self.outputs.append(self.titles(self.plex))
+
+    def sleep(self, seconds):
+        self.delays.append(seconds)
+        if self.changes:
+            self.changes.pop(0)()
+
+    def stop(self):
+        self.server.stop()
+        # Kept-alive connections would still be answered by the stopped server
+        self.plex.config._session.close()
+
+    def restart(self):
+        self.server = FakePlexServer(self.library, address=self.server.server_address).start()
+
+    def watch(self, polls, **kwargs):
+        watcher = Watcher([self.plex], self.render, interval=1, debounce=0, sleep=self.sleep, **kwargs)
+        watcher.run(polls)
+        return watcher
+
+    def test_renders_changes(self):
+        self.changes = [
+            lambda: self.library.rename(KIND_BASE * MOVIE + 2, 'Renamed movie'),
+            lambda: None,
+            lambda: self.library.add_movie(),
+        ]
+        watcher = self.watch(3)
+        self.assertEqual(watcher.renders, 2)
+        self.assertEqual(len(self.outputs), 3)
+        self.assertIn('Renamed movie', self.outputs[1])
+        self.assertEqual(len(self.outputs[2]), len(self.outputs[0]) + 1)
+        self.assertFalse(self.plex.config.bypass_cache)
+
+    def test_renders_changed_episodes(self):
+        self.titles = episode_titles
+        self.outputs = [episode_titles(self.plex)]
+        self.changes = [lambda: self.library.rename(KIND_BASE * EPISODE + 2, 'Renamed episode')]
+        watcher = self.watch(1)
+        self.assertEqual(watcher.renders, 1)
+        self.assertEqual(self.outputs[1], [x if i != 1 else 'Renamed episode' for i, x in enumerate(self.outputs[0])])
+
+    def test_backs_off_while_unreachable(self):
+        self.changes = [
+            self.stop,
+            lambda: None,
+            lambda: None,
+            lambda: (self.restart(), self.library.rename(KIND_BASE * MOVIE + 3, 'Renamed movie')),
+        ]
+        watcher = self.watch(4, max_backoff=3)
+        self.assertEqual(self.delays, [1, 2, 3, 3])
+        self.assertEqual(watcher.errors, 3)
+        self.assertEqual(watcher.renders, 1)
+        self.assertIn('Renamed movie', self.outputs[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()